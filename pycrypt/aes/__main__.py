@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+File encryption tool
+
+Usage (from `pycrypt` directory):
+    python -m aes encrypt --mode ctr --key <hex> in out
+    python -m aes decrypt --mode ctr --key <hex> in out
+    python -m aes range --key <hex> --offset 1024 --length 64 in out
+"""
+
+import argparse
+import sys
+
+from aes.ttable import KEY_SIZES
+from aes.fileio import encrypt_file, decrypt_file, decrypt_range, CHUNK_SIZE
+
+
+def _parse_key(value: str) -> bytes:
+    key = bytes.fromhex(value)
+    if len(key) not in KEY_SIZES:
+        raise argparse.ArgumentTypeError(
+            'Key must be 16, 24 or 32 bytes (32, 48 or 64 hex digits)')
+    return key
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='python -m aes',
+                                     description='AES file encryption')
+    sub = parser.add_subparsers(dest='command', required=True)
+
+    for name in ('encrypt', 'decrypt'):
+        cmd = sub.add_parser(name, help=f'{name} file')
+        cmd.add_argument('--mode', choices=['cbc', 'ctr'], default='cbc')
+        cmd.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+        cmd.add_argument('--workers', type=int, default=1,
+                         help='process pool size, 0 for all cores')
+
+    rng = sub.add_parser('range', help='decrypt byte range of CTR file')
+    rng.add_argument('--offset', type=int, required=True)
+    rng.add_argument('--length', type=int, required=True)
+
+    for name, cmd in sub.choices.items():
+        cmd.add_argument('--key', type=_parse_key, required=True,
+                         help='16, 24 or 32-byte key in hex')
+        cmd.add_argument('input')
+        # encrypt and decrypt map the output file, so it must be a file
+        cmd.add_argument('output', help="output file, '-' for stdout"
+                         if name == 'range' else 'output file')
+    return parser
+
+
+def cli_main(argv=None):
+    parser = _build_parser()
+    args = parser.parse_args(argv)
+
+    if args.command == 'range':
+        data = decrypt_range(args.input, args.key, args.offset, args.length)
+        if args.output == '-':
+            sys.stdout.buffer.write(data)
+        else:
+            with open(args.output, 'wb') as f:
+                f.write(data)
+        return
+
+    if args.output == '-':
+        parser.error(f'{args.command} writes to a file, not to stdout')
+    process = encrypt_file if args.command == 'encrypt' else decrypt_file
+    stats = process(args.input, args.output, args.key, mode=args.mode,
+                    chunk_size=args.chunk_size, workers=args.workers or None)
+    print(f'{args.command}ed {stats.size} bytes in {stats.seconds:.3f} s '
+          f'({stats.throughput:.2f} MiB/s)', file=sys.stderr)
+
+
+if __name__ == '__main__':
+    cli_main()
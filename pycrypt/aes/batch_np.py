@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+NumPy batch AES engine
+
+N blocks are kept as (N, 16) uint8 array (byte order of the block, i.e.
+column-major AES state) and every round transformation is applied to the
+whole batch at once: SubBytes is a table gather, ShiftRows is fancy
+indexing, MixColumns uses xtime / multiplication lookup arrays.
+
+NumPy is optional: `available()` tells whether the engine can be used.
+"""
+
+from typing import List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from aes import tables
+
+
+# state byte index is 4 * column + row
+SHIFT_ROWS = [((i // 4 + i % 4) % 4) * 4 + i % 4 for i in range(16)]
+INV_SHIFT_ROWS = [SHIFT_ROWS.index(i) for i in range(16)]
+
+
+def available() -> bool:
+    return np is not None
+
+
+if np is not None:
+    S_BOX, INV_S_BOX, MUL2, MUL9, MUL11, MUL13, MUL14 = (
+        np.array(t, dtype=np.uint8)
+        for t in (tables.S_BOX, tables.INV_S_BOX, tables.MUL2, tables.MUL9,
+                  tables.MUL11, tables.MUL13, tables.MUL14))
+
+
+def round_keys(rk: List[int]):
+    """Converts round key words to (Nr + 1, 16) uint8 array"""
+    words = np.array(rk, dtype='>u4')
+    return words.view(np.uint8).reshape(-1, 16)
+
+
+def _mix_columns(state):
+    a = state.reshape(-1, 4, 4)
+    a1 = np.roll(a, -1, axis=2)
+    a2 = np.roll(a, -2, axis=2)
+    a3 = np.roll(a, -3, axis=2)
+    # 2 * a0 ^ 3 * a1 ^ a2 ^ a3
+    res = MUL2[a ^ a1] ^ a1 ^ a2 ^ a3
+    return res.reshape(-1, 16)
+
+
+def _inv_mix_columns(state):
+    a = state.reshape(-1, 4, 4)
+    a1 = np.roll(a, -1, axis=2)
+    a2 = np.roll(a, -2, axis=2)
+    a3 = np.roll(a, -3, axis=2)
+    res = MUL14[a] ^ MUL11[a1] ^ MUL13[a2] ^ MUL9[a3]
+    return res.reshape(-1, 16)
+
+
+def encrypt_blocks(blocks, rk):
+    """Encrypts (N, 16) uint8 array, `rk` from `round_keys`"""
+    nr = len(rk) - 1
+    state = blocks ^ rk[0]
+    for r in range(1, nr):
+        state = S_BOX[state][:, SHIFT_ROWS]
+        state = _mix_columns(state)
+        state ^= rk[r]
+    state = S_BOX[state][:, SHIFT_ROWS]
+    state ^= rk[nr]
+    return state
+
+
+def decrypt_blocks(blocks, rk):
+    """Decrypts (N, 16) uint8 array, `rk` from `round_keys` (not inverted)"""
+    nr = len(rk) - 1
+    state = blocks ^ rk[nr]
+    for r in range(nr - 1, 0, -1):
+        state = INV_S_BOX[state[:, INV_SHIFT_ROWS]]
+        state ^= rk[r]
+        state = _inv_mix_columns(state)
+    state = INV_S_BOX[state[:, INV_SHIFT_ROWS]]
+    state ^= rk[0]
+    return state
+
+
+def _counter_blocks(counter: int, n_blocks: int):
+    """(n_blocks, 16) array of big-endian counter blocks, modulo 2^128"""
+    hi = (counter >> 64) & 0xFFFFFFFFFFFFFFFF
+    lo = counter & 0xFFFFFFFFFFFFFFFF
+    lo_arr = np.arange(n_blocks, dtype=np.uint64) + np.uint64(lo)
+    # carry from the low half where addition wrapped around
+    hi_arr = np.full(n_blocks, hi, dtype=np.uint64) + \
+        (lo_arr < np.uint64(lo)).astype(np.uint64)
+    blocks = np.empty((n_blocks, 2), dtype='>u8')
+    blocks[:, 0] = hi_arr
+    blocks[:, 1] = lo_arr
+    return blocks.view(np.uint8).reshape(n_blocks, 16)
+
+
+def ctr_keystream(rk, counter: int, n_blocks: int) -> bytes:
+    return encrypt_blocks(_counter_blocks(counter, n_blocks), rk).tobytes()
+
+
+def decrypt_cbc(rk, data, iv: bytes, out=None):
+    """
+    CBC decryption of block-aligned buffer `data`
+
+    Result is written to writable buffer `out` if it is given (may be the
+    same buffer as `data`), otherwise returned as bytes
+    """
+    blocks = np.frombuffer(data, dtype=np.uint8).reshape(-1, 16)
+    prev = np.empty_like(blocks)
+    prev[0] = np.frombuffer(iv, dtype=np.uint8)
+    prev[1:] = blocks[:-1]
+    decrypted = decrypt_blocks(blocks, rk)
+    if out is None:
+        return (decrypted ^ prev).tobytes()
+    dst = np.frombuffer(out, dtype=np.uint8).reshape(-1, 16)
+    np.bitwise_xor(decrypted, prev, out=dst)
@@ -0,0 +1,312 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Bitsliced AES encryption over Python big integers
+
+A batch of N blocks is stored as eight ints, one per bit plane: plane k
+holds bit k of every state byte, bit `16 * b + p` of the plane is byte p
+of block b. All blocks go through every operation at once:
+
+- SubBytes is the Boyar-Peralta S-box circuit (32 AND, 81 XOR/XNOR),
+- ShiftRows and MixColumns row rotations are shifts and masks inside
+  16-bit lanes, xtime is a renaming of planes plus three xors,
+- AddRoundKey xors planes with round key lanes repeated N times.
+
+No table is indexed by secret data. CPython does not guarantee constant
+time big-int arithmetic, though, so this removes cache-timing leaks of
+table lookups rather than giving a hard constant-time guarantee.
+
+Only the encryption direction is implemented: it is what CTR keystream
+generation needs.
+"""
+
+from functools import lru_cache
+from typing import List
+
+from aes.ttable import WORDS
+
+
+# blocks per batch: big enough to amortize interpreter overhead, small
+# enough to keep planes in cache
+BATCH_BLOCKS = 512
+_MAX_BLOCK = (1 << 128) - 1
+
+# ShiftRows: state byte index is 4 * column + row
+_SHIFT_ROWS = [((i // 4 + i % 4) % 4) * 4 + i % 4 for i in range(16)]
+# row rotations inside a column, used by MixColumns
+_ROT1 = [(i // 4) * 4 + (i + 1) % 4 for i in range(16)]
+_ROT2 = [(i // 4) * 4 + (i + 2) % 4 for i in range(16)]
+
+# 8x8 bit matrix transpose steps inside 64-bit words: (shift, mask)
+_TRANSPOSE = [(7, 0x00AA00AA00AA00AA),
+              (14, 0x0000CCCC0000CCCC),
+              (28, 0x00000000F0F0F0F0)]
+
+
+def _repeat(pattern: int, width: int, count: int) -> int:
+    """`pattern` of `width` bits repeated `count` times"""
+    return pattern * (((1 << (width * count)) - 1) // ((1 << width) - 1))
+
+
+class _Layout:
+    """Masks of a batch of `n` blocks"""
+
+    def __init__(self, n: int):
+        self.n = n
+        self.ones = (1 << (16 * n)) - 1
+        self.lanes = _repeat(1, 16, n)
+        self.transpose = [(shift, _repeat(mask, 64, 2 * n))
+                          for shift, mask in _TRANSPOSE]
+        self.shift_rows = self._permutation(_SHIFT_ROWS)
+        self.rot1 = self._permutation(_ROT1)
+        self.rot2 = self._permutation(_ROT2)
+
+    def _permutation(self, perm: List[int]):
+        """
+        Byte permutation `new[p] = old[perm[p]]` inside every lane as a
+        list of (shift, mask of target bits)
+        """
+        groups = {}
+        for dst, src in enumerate(perm):
+            groups[src - dst] = groups.get(src - dst, 0) | (1 << dst)
+        return [(shift, mask * self.lanes) for shift, mask in groups.items()]
+
+
+@lru_cache(maxsize=8)
+def _layout(n: int) -> _Layout:
+    return _Layout(n)
+
+
+def _permute(x: int, moves) -> int:
+    res = 0
+    for shift, mask in moves:
+        if shift >= 0:
+            res |= (x >> shift) & mask
+        else:
+            res |= (x << -shift) & mask
+    return res
+
+
+def _transpose(x: int, layout: _Layout) -> int:
+    for shift, mask in layout.transpose:
+        t = (x ^ (x >> shift)) & mask
+        x ^= t ^ (t << shift)
+    return x
+
+
+def pack(blocks: bytes, layout: _Layout) -> List[int]:
+    """16 * n bytes -> 8 bit planes"""
+    x = _transpose(int.from_bytes(blocks, 'little'), layout)
+    transposed = x.to_bytes(16 * layout.n, 'little')
+    return [int.from_bytes(transposed[k::8], 'little') for k in range(8)]
+
+
+def unpack(planes: List[int], layout: _Layout) -> bytes:
+    """8 bit planes -> 16 * n bytes"""
+    size = 2 * layout.n
+    transposed = bytearray(16 * layout.n)
+    for k in range(8):
+        transposed[k::8] = planes[k].to_bytes(size, 'little')
+    x = _transpose(int.from_bytes(transposed, 'little'), layout)
+    return x.to_bytes(16 * layout.n, 'little')
+
+
+def sub_bytes(planes: List[int], ones: int) -> List[int]:
+    """
+    Boyar-Peralta depth-16 S-box circuit
+
+    U0..U7 / S0..S7 are input / output bits, most significant first
+    """
+    U7, U6, U5, U4, U3, U2, U1, U0 = planes
+
+    T1 = U0 ^ U3
+    T2 = U0 ^ U5
+    T3 = U0 ^ U6
+    T4 = U3 ^ U5
+    T5 = U4 ^ U6
+    T6 = T1 ^ T5
+    T7 = U1 ^ U2
+    T8 = U7 ^ T6
+    T9 = U7 ^ T7
+    T10 = T6 ^ T7
+    T11 = U1 ^ U5
+    T12 = U2 ^ U5
+    T13 = T3 ^ T4
+    T14 = T6 ^ T11
+    T15 = T5 ^ T11
+    T16 = T5 ^ T12
+    T17 = T9 ^ T16
+    T18 = U3 ^ U7
+    T19 = T7 ^ T18
+    T20 = T1 ^ T19
+    T21 = U6 ^ U7
+    T22 = T7 ^ T21
+    T23 = T2 ^ T22
+    T24 = T2 ^ T10
+    T25 = T20 ^ T17
+    T26 = T3 ^ T16
+    T27 = T1 ^ T12
+
+    M1 = T13 & T6
+    M2 = T23 & T8
+    M3 = T14 ^ M1
+    M4 = T19 & U7
+    M5 = M4 ^ M1
+    M6 = T3 & T16
+    M7 = T22 & T9
+    M8 = T26 ^ M6
+    M9 = T20 & T17
+    M10 = M9 ^ M6
+    M11 = T1 & T15
+    M12 = T4 & T27
+    M13 = M12 ^ M11
+    M14 = T2 & T10
+    M15 = M14 ^ M11
+    M16 = M3 ^ M2
+    M17 = M5 ^ T24
+    M18 = M8 ^ M7
+    M19 = M10 ^ M15
+    M20 = M16 ^ M13
+    M21 = M17 ^ M15
+    M22 = M18 ^ M13
+    M23 = M19 ^ T25
+    M24 = M22 ^ M23
+    M25 = M22 & M20
+    M26 = M21 ^ M25
+    M27 = M20 ^ M21
+    M28 = M23 ^ M25
+    M29 = M28 & M27
+    M30 = M26 & M24
+    M31 = M20 & M23
+    M32 = M27 & M31
+    M33 = M27 ^ M25
+    M34 = M21 & M22
+    M35 = M24 & M34
+    M36 = M24 ^ M25
+    M37 = M21 ^ M29
+    M38 = M32 ^ M33
+    M39 = M23 ^ M30
+    M40 = M35 ^ M36
+    M41 = M38 ^ M40
+    M42 = M37 ^ M39
+    M43 = M37 ^ M38
+    M44 = M39 ^ M40
+    M45 = M42 ^ M41
+    M46 = M44 & T6
+    M47 = M40 & T8
+    M48 = M39 & U7
+    M49 = M43 & T16
+    M50 = M38 & T9
+    M51 = M37 & T17
+    M52 = M42 & T15
+    M53 = M45 & T27
+    M54 = M41 & T10
+    M55 = M44 & T13
+    M56 = M40 & T23
+    M57 = M39 & T19
+    M58 = M43 & T3
+    M59 = M38 & T22
+    M60 = M37 & T20
+    M61 = M42 & T1
+    M62 = M45 & T4
+    M63 = M41 & T2
+
+    L0 = M61 ^ M62
+    L1 = M50 ^ M56
+    L2 = M46 ^ M48
+    L3 = M47 ^ M55
+    L4 = M54 ^ M58
+    L5 = M49 ^ M61
+    L6 = M62 ^ L5
+    L7 = M46 ^ L3
+    L8 = M51 ^ M59
+    L9 = M52 ^ M53
+    L10 = M53 ^ L4
+    L11 = M60 ^ L2
+    L12 = M48 ^ M51
+    L13 = M50 ^ L0
+    L14 = M52 ^ M61
+    L15 = M55 ^ L1
+    L16 = M56 ^ L0
+    L17 = M57 ^ L1
+    L18 = M58 ^ L8
+    L19 = M63 ^ L4
+    L20 = L0 ^ L1
+    L21 = L1 ^ L7
+    L22 = L3 ^ L12
+    L23 = L18 ^ L2
+    L24 = L15 ^ L9
+    L25 = L6 ^ L10
+    L26 = L7 ^ L9
+    L27 = L8 ^ L10
+    L28 = L11 ^ L14
+    L29 = L11 ^ L17
+
+    S0 = L6 ^ L24
+    S1 = L16 ^ L26 ^ ones
+    S2 = L19 ^ L28 ^ ones
+    S3 = L6 ^ L21
+    S4 = L20 ^ L22
+    S5 = L25 ^ L29
+    S6 = L13 ^ L27 ^ ones
+    S7 = L6 ^ L23 ^ ones
+    return [S7, S6, S5, S4, S3, S2, S1, S0]
+
+
+def _mix_columns(planes: List[int], layout: _Layout) -> List[int]:
+    # out = 2 * (a ^ rot1(a)) ^ rot1(a) ^ rot2(a ^ rot1(a))
+    rot1 = [_permute(x, layout.rot1) for x in planes]
+    t = [a ^ b for a, b in zip(planes, rot1)]
+    t2 = [_permute(x, layout.rot2) for x in t]
+    # xtime: multiply by x, reduce by x^8 = x^4 + x^3 + x + 1
+    hi = t[7]
+    xt = [hi, t[0] ^ hi, t[1], t[2] ^ hi, t[3] ^ hi, t[4], t[5], t[6]]
+    return [xt[k] ^ rot1[k] ^ t2[k] for k in range(8)]
+
+
+def _round_key_planes(rk: WORDS, layout: _Layout) -> List[List[int]]:
+    """Round keys as bit planes with key lane repeated for every block"""
+    res = []
+    for r in range(len(rk) // 4):
+        key = b''.join(w.to_bytes(4, 'big') for w in rk[4 * r: 4 * r + 4])
+        lanes = []
+        for k in range(8):
+            lane = 0
+            for p in range(16):
+                lane |= ((key[p] >> k) & 1) << p
+            lanes.append(lane * layout.lanes)
+        res.append(lanes)
+    return res
+
+
+def encrypt_blocks(blocks: bytes, rk: WORDS) -> bytes:
+    """Encrypts block-aligned `blocks` with expanded key `rk`"""
+    assert len(blocks) % 16 == 0, "Data must be block-aligned"
+    if not blocks:
+        return b''
+    layout = _layout(len(blocks) // 16)
+    keys = _round_key_planes(rk, layout)
+    nr = len(keys) - 1
+
+    state = [a ^ b for a, b in zip(pack(blocks, layout), keys[0])]
+    for r in range(1, nr + 1):
+        state = sub_bytes(state, layout.ones)
+        state = [_permute(x, layout.shift_rows) for x in state]
+        if r != nr:
+            state = _mix_columns(state, layout)
+        state = [a ^ b for a, b in zip(state, keys[r])]
+    return unpack(state, layout)
+
+
+def ctr_keystream(rk: WORDS, counter: int, n_blocks: int,
+                  batch=BATCH_BLOCKS) -> bytes:
+    """Keystream of `n_blocks` starting at counter block `counter`"""
+    res = []
+    for start in range(0, n_blocks, batch):
+        count = min(batch, n_blocks - start)
+        counters = b''.join(((counter + i) & _MAX_BLOCK).to_bytes(16, 'big')
+                            for i in range(start, start + count))
+        res.append(encrypt_blocks(counters, rk))
+    return b''.join(res)
@@ -0,0 +1,224 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Keyed AES cipher object
+
+Key is expanded once on construction (both encryption and equivalent
+inverse cipher schedules), so encrypting a long message does not repeat
+key expansion for every block.
+
+Bulk operations (CTR keystream, CBC decryption) are handed to the NumPy
+batch engine when it is available and the batch is large enough. CTR
+keystream can also be produced by the bitsliced engine, which does no
+secret-dependent table lookups.
+"""
+
+from functools import lru_cache
+
+from buffers import byte_view, writable_byte_view
+
+from aes import ttable, gcm
+
+
+BLOCK_SIZE = 16
+_MAX_BLOCK = (1 << 128) - 1
+
+# Batch size (in blocks) from which NumPy engine beats T-tables. Measured
+# on CPython 3.11 / NumPy 2: T-tables ~21 us per block, NumPy ~530 us per
+# call plus 1-3 us per block, crossover at 26-29 blocks
+NUMPY_THRESHOLD = 32
+
+# CTR processes data in pieces of this size to bound keystream memory
+CTR_CHUNK = 1 << 16
+
+
+@lru_cache(maxsize=None)
+def _numpy_engine():
+    """
+    `aes.batch_np` module or None if NumPy is not installed
+
+    Imported on first bulk operation, so that importing AES stays cheap
+    """
+    from aes import batch_np
+    return batch_np if batch_np.available() else None
+
+
+class AES:
+    """
+    AES with cached key schedule, key is 16, 24 or 32 bytes long
+
+    `backend` selects engine for bulk operations: 'python' (T-tables),
+    'numpy', 'auto' (NumPy for batches of `NUMPY_THRESHOLD` blocks and
+    more, if NumPy is installed) or 'bitslice' (bitsliced CTR keystream,
+    T-tables for everything else)
+    """
+
+    block_size = BLOCK_SIZE
+    backends = ('auto', 'python', 'numpy', 'bitslice')
+
+    def __init__(self, key: bytes, backend: str = 'auto'):
+        assert len(key) in ttable.KEY_SIZES, \
+            "Key must be of 16, 24 or 32 bytes size"
+        if backend not in self.backends:
+            raise AttributeError(f'Unknown backend: {backend}')
+        if backend == 'numpy' and _numpy_engine() is None:
+            raise ImportError('NumPy backend requires numpy')
+        self.backend = backend
+        key = bytes(key)
+        self._rk = ttable.expand_key(key)
+        self._drk = ttable.expand_decryption_key(key)
+        self._np_rk = None
+        self._ghash = None
+
+    def _use_numpy(self, n_blocks: int) -> bool:
+        if self.backend == 'auto':
+            return n_blocks >= NUMPY_THRESHOLD and _numpy_engine() is not None
+        return self.backend == 'numpy'
+
+    def _numpy_round_keys(self):
+        if self._np_rk is None:
+            self._np_rk = _numpy_engine().round_keys(self._rk)
+        return self._np_rk
+
+    def encrypt_block(self, block: bytes) -> bytes:
+        assert len(block) == BLOCK_SIZE, "Chunk must be of 16 bytes size"
+        return ttable.encrypt_block(block, self._rk)
+
+    def decrypt_block(self, block: bytes) -> bytes:
+        assert len(block) == BLOCK_SIZE, "Chunk must be of 16 bytes size"
+        return ttable.decrypt_block(block, self._drk)
+
+    @staticmethod
+    def _buffers(data, out):
+        """Flat byte views of input and output buffers"""
+        src, dst = byte_view(data), writable_byte_view(out)
+        assert len(dst) >= len(src), \
+            f"Output buffer is too small: {len(dst)} < {len(src)}"
+        return src, dst
+
+    def _encrypt_cbc_into(self, src, dst, iv):
+        assert len(src) % BLOCK_SIZE == 0, "Data must be block-aligned"
+        assert len(iv) == BLOCK_SIZE, "IV must be of 16 bytes size"
+        encrypt, rk = ttable.encrypt_int, self._rk
+        from_bytes = int.from_bytes
+        prev = from_bytes(iv, 'big')
+        for i in range(0, len(src), BLOCK_SIZE):
+            prev = encrypt(prev ^ from_bytes(src[i: i + BLOCK_SIZE], 'big'), rk)
+            dst[i: i + BLOCK_SIZE] = prev.to_bytes(BLOCK_SIZE, 'big')
+
+    def _decrypt_cbc_into(self, src, dst, iv):
+        assert len(src) % BLOCK_SIZE == 0, "Data must be block-aligned"
+        assert len(iv) == BLOCK_SIZE, "IV must be of 16 bytes size"
+        if src and self._use_numpy(len(src) // BLOCK_SIZE):
+            _numpy_engine().decrypt_cbc(self._numpy_round_keys(), src, iv,
+                                        out=dst[:len(src)])
+            return
+        decrypt, drk = ttable.decrypt_int, self._drk
+        from_bytes = int.from_bytes
+        prev = from_bytes(iv, 'big')
+        for i in range(0, len(src), BLOCK_SIZE):
+            # read before write, `dst` may be the same buffer as `src`
+            cur = from_bytes(src[i: i + BLOCK_SIZE], 'big')
+            dst[i: i + BLOCK_SIZE] = \
+                (decrypt(cur, drk) ^ prev).to_bytes(BLOCK_SIZE, 'big')
+            prev = cur
+
+    def _crypt_ctr_into(self, src, dst, counter):
+        from_bytes = int.from_bytes
+        for start in range(0, len(src), CTR_CHUNK):
+            piece = src[start: start + CTR_CHUNK]
+            n_blocks = -(-len(piece) // BLOCK_SIZE)
+            keystream = memoryview(
+                self.ctr_keystream(counter + start // BLOCK_SIZE, n_blocks))
+            res = from_bytes(piece, 'big') ^ \
+                from_bytes(keystream[:len(piece)], 'big')
+            dst[start: start + len(piece)] = res.to_bytes(len(piece), 'big')
+
+    def encrypt_into(self, data, out, mode: str = 'CBC',
+                     iv: bytes = None, counter: int = None) -> int:
+        """
+        Encrypts any buffer `data` into writable buffer `out`
+
+        `out` may be the same buffer as `data` (in-place encryption).
+        CBC needs block-aligned data and `iv`, CTR needs first counter
+        block `counter`. No IV/counter header and no padding are written.
+        Returns number of bytes written.
+        """
+        src, dst = self._buffers(data, out)
+        if mode == 'CBC':
+            self._encrypt_cbc_into(src, dst, iv)
+        elif mode == 'CTR':
+            self._crypt_ctr_into(src, dst, counter)
+        else:
+            raise AttributeError(f'Unknown mode: {mode}')
+        return len(src)
+
+    def decrypt_into(self, data, out, mode: str = 'CBC',
+                     iv: bytes = None, counter: int = None) -> int:
+        """Inverse of `encrypt_into`, same buffer requirements"""
+        src, dst = self._buffers(data, out)
+        if mode == 'CBC':
+            self._decrypt_cbc_into(src, dst, iv)
+        elif mode == 'CTR':
+            self._crypt_ctr_into(src, dst, counter)
+        else:
+            raise AttributeError(f'Unknown mode: {mode}')
+        return len(src)
+
+    def encrypt_cbc(self, data: bytes, iv: bytes) -> bytes:
+        """CBC encryption of block-aligned `data`. IV is not prepended"""
+        out = bytearray(len(data))
+        self.encrypt_into(data, out, 'CBC', iv=iv)
+        return bytes(out)
+
+    def decrypt_cbc(self, data: bytes, iv: bytes) -> bytes:
+        """CBC decryption of block-aligned `data` (without IV prefix)"""
+        out = bytearray(len(data))
+        self.decrypt_into(data, out, 'CBC', iv=iv)
+        return bytes(out)
+
+    def ctr_keystream(self, counter: int, n_blocks: int) -> bytes:
+        """Keystream of `n_blocks` starting at counter block `counter`"""
+        if self.backend == 'bitslice':
+            from aes import bitslice
+            return bitslice.ctr_keystream(self._rk, counter, n_blocks)
+        if n_blocks and self._use_numpy(n_blocks):
+            return _numpy_engine().ctr_keystream(self._numpy_round_keys(),
+                                                 counter & _MAX_BLOCK, n_blocks)
+        encrypt, rk = ttable.encrypt_int, self._rk
+        res = []
+        for i in range(n_blocks):
+            block = encrypt((counter + i) & _MAX_BLOCK, rk)
+            res.append(block.to_bytes(BLOCK_SIZE, 'big'))
+        return b''.join(res)
+
+    def crypt_ctr(self, data: bytes, counter: int) -> bytes:
+        """
+        CTR encryption/decryption, first block uses counter block `counter`
+
+        `data` does not have to be block-aligned
+        """
+        out = bytearray(len(data))
+        self.encrypt_into(data, out, 'CTR', counter=counter)
+        return bytes(out)
+
+    def _ghash_tables(self) -> gcm.GHash:
+        """GHASH tables for hash key E(0), built on first GCM call"""
+        if self._ghash is None:
+            h = ttable.encrypt_int(0, self._rk)
+            self._ghash = gcm.GHash(h)
+        return self._ghash
+
+    def encrypt_gcm(self, data, iv: bytes, aad=b'', tag_size=16):
+        """GCM encryption. Returns (ciphertext, tag)"""
+        return gcm.encrypt(self, self._ghash_tables(), data, iv, aad, tag_size)
+
+    def decrypt_gcm(self, data, iv: bytes, tag: bytes, aad=b'') -> bytes:
+        """GCM decryption. Raises `AuthenticationError` on tag mismatch"""
+        return gcm.decrypt(self, self._ghash_tables(), data, iv, tag, aad)
+
+
+# name from the time only 128-bit keys were supported
+AES128 = AES
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+File encryption/decryption on top of AES modes
+
+Input file is memory-mapped, output file is preallocated and memory-mapped
+as well, so data is encrypted from one mapping into the other in large
+chunks without reading the whole file into memory. Files have the same
+layout as `aes_encrypt` output: IV/counter block, then data padded with
+b'0' to the block size.
+
+CTR files also support decryption of an arbitrary byte range, which only
+touches blocks that overlap the range.
+"""
+
+import mmap
+import os
+import time
+from dataclasses import dataclass
+from random import getrandbits
+
+from aes.cipher import AES, BLOCK_SIZE
+from aes.ttable import KEY_SIZES
+from aes.parallel import (crypt_ctr_parallel_into, decrypt_cbc_parallel_into,
+                          make_pool)
+
+
+CHUNK_SIZE = 1 << 20    # bytes, multiple of block size
+
+
+@dataclass
+class FileStats:
+    """Amount of processed data and time spent"""
+    size: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """MiB per second"""
+        if self.seconds == 0:
+            return 0.0
+        return self.size / self.seconds / (1 << 20)
+
+
+def _map_read(f):
+    """Read-only mapping of the whole file or b'' for an empty file"""
+    f.seek(0, 2)
+    if f.tell() == 0:
+        return b''
+    return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _map_write(f, size: int):
+    """Writable mapping of file truncated to `size` bytes"""
+    f.truncate(size)
+    if size == 0:
+        return bytearray()
+    return mmap.mmap(f.fileno(), size)
+
+
+def _check_mode(mode: str) -> str:
+    mode = mode.upper()
+    if mode not in ("CBC", "CTR"):
+        raise AttributeError(f'Unknown mode: {mode}')
+    return mode
+
+
+def _close(*maps, failed: bool = False):
+    """
+    Closes mappings. If work on them failed, views of a mapping may
+    still be referenced from the traceback of the error: such mapping is
+    left to the garbage collector instead of hiding the error with
+    BufferError
+    """
+    for m in maps:
+        if not isinstance(m, mmap.mmap):
+            continue
+        try:
+            m.close()
+        except BufferError:
+            if not failed:
+                raise
+
+
+def _check_paths(in_path: str, out_path: str):
+    """Output is truncated before input is read, so they must differ"""
+    if os.path.exists(out_path) and os.path.samefile(in_path, out_path):
+        raise ValueError(f'Input and output are the same file: {in_path}')
+
+
+def encrypt_file(in_path: str, out_path: str, key: bytes, mode='CBC',
+                 iv=None, ctr_val=None, chunk_size=CHUNK_SIZE,
+                 workers=1) -> FileStats:
+    """File equivalent of `aes_encrypt`"""
+    assert len(key) in KEY_SIZES, "Key must be of 16, 24 or 32 bytes size"
+    assert chunk_size % BLOCK_SIZE == 0, "Chunk size must be block-aligned"
+    mode = _check_mode(mode)
+    _check_paths(in_path, out_path)
+    cipher = AES(key)
+    start = time.perf_counter()
+
+    with open(in_path, 'rb') as fin, open(out_path, 'w+b') as fout:
+        src = _map_read(fin)
+        dst = None
+        try:
+            size = len(src)
+            padded = -(-size // BLOCK_SIZE) * BLOCK_SIZE
+            dst = _map_write(fout, BLOCK_SIZE + padded)
+            if mode == 'CBC':
+                if not iv:
+                    iv = int.to_bytes(getrandbits(128), 16, 'big')
+                dst[:BLOCK_SIZE] = iv
+            else:
+                if not ctr_val:
+                    ctr_val = getrandbits(128)
+                dst[:BLOCK_SIZE] = int.to_bytes(ctr_val, 16, 'big')
+                counter = ctr_val + 1
+
+            # CBC encryption is sequential
+            pool_workers = workers if mode == 'CTR' else 1
+            with make_pool(pool_workers, size) as pool, \
+                    memoryview(src) as src_view, memoryview(dst) as dst_view:
+                for pos in range(0, padded, chunk_size):
+                    end = min(pos + chunk_size, padded)
+                    with src_view[pos: end] as piece, \
+                            dst_view[BLOCK_SIZE + pos: BLOCK_SIZE + end] as out:
+                        data = piece
+                        if len(piece) % BLOCK_SIZE:
+                            data = bytes(piece) + \
+                                b'0' * (BLOCK_SIZE - len(piece) % BLOCK_SIZE)
+                        if mode == 'CBC':
+                            cipher.encrypt_into(data, out, 'CBC', iv=iv)
+                            iv = bytes(out[-BLOCK_SIZE:])
+                        else:
+                            crypt_ctr_parallel_into(key, data, out, counter,
+                                                    workers, pool=pool)
+                            counter += len(data) // BLOCK_SIZE
+                        del data
+        except BaseException:
+            _close(src, dst, failed=True)
+            raise
+        _close(src, dst)
+
+    return FileStats(size, time.perf_counter() - start)
+
+
+def decrypt_file(in_path: str, out_path: str, key: bytes, mode='CBC',
+                 chunk_size=CHUNK_SIZE, workers=1) -> FileStats:
+    """File equivalent of `aes_decrypt`"""
+    assert len(key) in KEY_SIZES, "Key must be of 16, 24 or 32 bytes size"
+    assert chunk_size % BLOCK_SIZE == 0, "Chunk size must be block-aligned"
+    mode = _check_mode(mode)
+    _check_paths(in_path, out_path)
+    start = time.perf_counter()
+
+    with open(in_path, 'rb') as fin, open(out_path, 'w+b') as fout:
+        # checked before mapping, so nothing is left open on failure
+        total = os.fstat(fin.fileno()).st_size
+        assert total >= BLOCK_SIZE and total % BLOCK_SIZE == 0, \
+            "Ciphertext must contain IV and be block-aligned"
+        src = _map_read(fin)
+        dst = None
+        try:
+            size = len(src) - BLOCK_SIZE
+            dst = _map_write(fout, size)
+            with make_pool(workers, size) as pool, \
+                    memoryview(src) as src_view, memoryview(dst) as dst_view:
+                iv = bytes(src_view[:BLOCK_SIZE])
+                counter = int.from_bytes(iv, 'big') + 1
+                for pos in range(0, size, chunk_size):
+                    with src_view[BLOCK_SIZE + pos:
+                                  BLOCK_SIZE + pos + chunk_size] as piece, \
+                            dst_view[pos: pos + len(piece)] as out:
+                        if mode == 'CBC':
+                            decrypt_cbc_parallel_into(key, piece, out, iv,
+                                                      workers, pool=pool)
+                            iv = bytes(piece[-BLOCK_SIZE:])
+                        else:
+                            crypt_ctr_parallel_into(key, piece, out, counter,
+                                                    workers, pool=pool)
+                            counter += len(piece) // BLOCK_SIZE
+        except BaseException:
+            _close(src, dst, failed=True)
+            raise
+        _close(src, dst)
+
+    return FileStats(size, time.perf_counter() - start)
+
+
+def decrypt_range(in_path: str, key: bytes, offset: int, length: int,
+                  cache=None) -> bytes:
+    """
+    Decrypts `length` bytes of CTR-encrypted file starting at plaintext
+    byte `offset`. Counter is moved straight to the first needed block.
+    Keystream is taken from `cache` (`KeystreamCache`) if it is given
+    """
+    assert offset >= 0 and length >= 0
+    with open(in_path, 'rb') as f:
+        header = f.read(BLOCK_SIZE)
+        assert len(header) == BLOCK_SIZE, "Ciphertext must contain counter"
+        first_block = offset // BLOCK_SIZE
+        f.seek(BLOCK_SIZE + first_block * BLOCK_SIZE)
+        data = f.read(offset % BLOCK_SIZE + length)
+
+    counter = int.from_bytes(header, 'big') + 1 + first_block
+    if cache is not None:
+        return cache.crypt(key, data, counter)[offset % BLOCK_SIZE:]
+    return AES(key).crypt_ctr(data, counter)[offset % BLOCK_SIZE:]
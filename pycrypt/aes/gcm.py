@@ -0,0 +1,145 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Galois/Counter Mode (NIST SP 800-38D)
+
+Encryption is CTR mode of the cipher with 32-bit counter increment.
+GHASH multiplies by the hash key H with Shoup's 8-bit table method: per
+key table M[i] = i * H for all bytes i and a key-independent reduction
+table R, so one block costs 16 lookups instead of 128 shift-and-xor steps.
+
+Field elements are 128-bit ints in GCM bit order: the most significant
+bit of the int is the coefficient of x^0.
+"""
+
+import hmac
+from typing import List, Tuple
+
+
+BLOCK_SIZE = 16
+# x^128 + x^7 + x^2 + x + 1, reflected
+_R = 0xE1 << 120
+_MASK32 = 0xFFFFFFFF
+
+
+class AuthenticationError(Exception): pass
+
+
+def gf128_mul(x: int, y: int) -> int:
+    """Bit-by-bit multiplication in GF(2^128). Reference for the tables"""
+    z = 0
+    v = y
+    for i in range(127, -1, -1):
+        if (x >> i) & 1:
+            z ^= v
+        v = (v >> 1) ^ _R if v & 1 else v >> 1
+    return z
+
+
+def _build_reduction_table() -> List[int]:
+    """R[r]: reduction of low byte `r` shifted out when multiplying by x^8"""
+    table = []
+    for r in range(256):
+        z = r
+        for i in range(8):
+            z = (z >> 1) ^ _R if z & 1 else z >> 1
+        table.append(z)
+    return table
+
+
+_REDUCTION = _build_reduction_table()
+
+
+class GHash:
+    """Multiplication by fixed hash key `h` with precomputed table"""
+
+    def __init__(self, h: int):
+        # byte 0x80 is x^0, each next lower bit is the next power of x
+        table = [0] * 256
+        v = h
+        bit = 0x80
+        while bit:
+            table[bit] = v
+            v = (v >> 1) ^ _R if v & 1 else v >> 1
+            bit >>= 1
+        for i in range(2, 256):
+            low = i & -i
+            if i != low:
+                table[i] = table[low] ^ table[i ^ low]
+        self._table = table
+
+    def mul_h(self, x: int) -> int:
+        table, reduction = self._table, _REDUCTION
+        z = 0
+        # Horner scheme from the last byte (highest powers) to the first
+        for shift in range(0, 128, 8):
+            z = (z >> 8) ^ reduction[z & 0xff] ^ table[(x >> shift) & 0xff]
+        return z
+
+    def update(self, y: int, data) -> int:
+        """Absorbs `data` (zero-padded to block size) into GHASH value `y`"""
+        mul_h = self.mul_h
+        from_bytes = int.from_bytes
+        full = len(data) - len(data) % BLOCK_SIZE
+        for i in range(0, full, BLOCK_SIZE):
+            y = mul_h(y ^ from_bytes(data[i: i + BLOCK_SIZE], 'big'))
+        if full != len(data):
+            tail = bytes(data[full:]).ljust(BLOCK_SIZE, b'\x00')
+            y = mul_h(y ^ from_bytes(tail, 'big'))
+        return y
+
+
+def _pre_counter_block(ghash: GHash, iv: bytes) -> int:
+    if len(iv) == 12:
+        return (int.from_bytes(iv, 'big') << 32) | 1
+    y = ghash.update(0, iv)
+    return ghash.mul_h(y ^ (len(iv) * 8))
+
+
+def _gctr(cipher, data, counter: int) -> bytes:
+    """CTR with increment of the low 32 bits of the counter block only"""
+    n_blocks = -(-len(data) // BLOCK_SIZE)
+    before_wrap = (1 << 32) - (counter & _MASK32)
+    if n_blocks <= before_wrap:
+        return cipher.crypt_ctr(data, counter)
+    split = before_wrap * BLOCK_SIZE
+    wrapped = counter & ~_MASK32
+    return cipher.crypt_ctr(data[:split], counter) + \
+        cipher.crypt_ctr(data[split:], wrapped)
+
+
+def _tag(cipher, ghash: GHash, j0: int, aad, ciphertext) -> bytes:
+    s = ghash.update(0, aad)
+    s = ghash.update(s, ciphertext)
+    s = ghash.mul_h(s ^ ((len(aad) * 8) << 64) ^ (len(ciphertext) * 8))
+    return _xor_block(cipher.encrypt_block(j0.to_bytes(16, 'big')), s)
+
+
+def _xor_block(block: bytes, value: int) -> bytes:
+    return (int.from_bytes(block, 'big') ^ value).to_bytes(BLOCK_SIZE, 'big')
+
+
+def _inc32(block: int) -> int:
+    return (block & ~_MASK32) | ((block + 1) & _MASK32)
+
+
+def encrypt(cipher, ghash: GHash, data, iv: bytes,
+            aad=b'', tag_size=16) -> Tuple[bytes, bytes]:
+    assert len(iv) > 0, "IV must not be empty"
+    assert 12 <= tag_size <= 16, "Tag must be of 12..16 bytes size"
+    j0 = _pre_counter_block(ghash, iv)
+    ciphertext = _gctr(cipher, data, _inc32(j0))
+    return ciphertext, _tag(cipher, ghash, j0, aad, ciphertext)[:tag_size]
+
+
+def decrypt(cipher, ghash: GHash, data, iv: bytes, tag: bytes,
+            aad=b'') -> bytes:
+    assert len(iv) > 0, "IV must not be empty"
+    assert 12 <= len(tag) <= 16, "Tag must be of 12..16 bytes size"
+    j0 = _pre_counter_block(ghash, iv)
+    expected = _tag(cipher, ghash, j0, aad, data)[:len(tag)]
+    if not hmac.compare_digest(expected, tag):
+        raise AuthenticationError('GCM tag mismatch')
+    return _gctr(cipher, data, _inc32(j0))
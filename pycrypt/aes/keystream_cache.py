@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+LRU cache of CTR keystream
+
+Keystream depends only on the key and the counter block, so when the same
+ranges of a CTR-encrypted object are decrypted again and again, keystream
+can be reused instead of running the block cipher. Keystream is generated
+and stored in segments of `segment_blocks` blocks aligned to multiples of
+`segment_blocks`, keyed by (key fingerprint, first counter block). Raw
+keys are never stored, only their SHA-256 fingerprints.
+
+Total size of stored segments is bounded by `max_bytes`, least recently
+used segments are evicted first.
+"""
+
+import hashlib
+from collections import OrderedDict
+
+from aes.cipher import AES, BLOCK_SIZE
+
+
+MAX_BYTES = 16 << 20
+SEGMENT_BLOCKS = 256
+_COUNTER_SPACE = 1 << 128
+
+
+def fingerprint(key: bytes) -> bytes:
+    return hashlib.sha256(b'pycrypt ctr keystream\x00' + bytes(key)).digest()
+
+
+class KeystreamCache:
+    """
+    Byte-budgeted LRU of keystream segments
+
+    `hits`, `misses` and `evictions` count segment lookups
+    """
+
+    def __init__(self, max_bytes: int = MAX_BYTES,
+                 segment_blocks: int = SEGMENT_BLOCKS):
+        assert segment_blocks > 0 and \
+            segment_blocks & (segment_blocks - 1) == 0, \
+            "Segment size must be a power of two"
+        assert max_bytes >= segment_blocks * BLOCK_SIZE, \
+            "Cache must hold at least one segment"
+        self.max_bytes = max_bytes
+        self.segment_blocks = segment_blocks
+        self._segments = OrderedDict()
+        self.size = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def __len__(self):
+        return len(self._segments)
+
+    def clear(self):
+        """Drops all segments, counters are kept"""
+        self._segments.clear()
+        self.size = 0
+
+    def _segment(self, fp: bytes, start: int, cipher_factory) -> bytes:
+        entry = (fp, start)
+        segment = self._segments.get(entry)
+        if segment is not None:
+            self._segments.move_to_end(entry)
+            self.hits += 1
+            return segment
+
+        self.misses += 1
+        segment = cipher_factory().ctr_keystream(start, self.segment_blocks)
+        self._segments[entry] = segment
+        self.size += len(segment)
+        while self.size > self.max_bytes:
+            _, old = self._segments.popitem(last=False)
+            self.size -= len(old)
+            self.evictions += 1
+        return segment
+
+    def keystream(self, key: bytes, counter: int, n_blocks: int) -> bytes:
+        """Same as `AES(key).ctr_keystream(counter, n_blocks)`"""
+        fp = fingerprint(key)
+        cipher = None
+
+        def cipher_factory():
+            nonlocal cipher
+            if cipher is None:
+                cipher = AES(key)
+            return cipher
+
+        seg = self.segment_blocks
+        counter %= _COUNTER_SPACE
+        res = []
+        # first segment may be needed from the middle
+        offset = counter % seg
+        start = counter - offset
+        left = n_blocks
+        while left > 0:
+            segment = self._segment(fp, start, cipher_factory)
+            take = min(seg - offset, left)
+            res.append(segment[offset * BLOCK_SIZE: (offset + take) * BLOCK_SIZE])
+            left -= take
+            offset = 0
+            start = (start + seg) % _COUNTER_SPACE
+        return b''.join(res)
+
+    def crypt_into(self, key: bytes, data, out, counter: int) -> int:
+        """
+        Same as `AES(key).encrypt_into(data, out, 'CTR', counter=counter)`
+        with keystream taken from the cache. Returns number of bytes written
+        """
+        src, dst = AES._buffers(data, out)
+        n_blocks = -(-len(src) // BLOCK_SIZE)
+        keystream = memoryview(self.keystream(key, counter, n_blocks))
+        from_bytes = int.from_bytes
+        res = from_bytes(src, 'big') ^ from_bytes(keystream[:len(src)], 'big')
+        dst[:len(src)] = res.to_bytes(len(src), 'big')
+        return len(src)
+
+    def crypt(self, key: bytes, data: bytes, counter: int) -> bytes:
+        """Same as `AES(key).crypt_ctr(data, counter)`"""
+        out = bytearray(len(data))
+        self.crypt_into(key, data, out, counter)
+        return bytes(out)
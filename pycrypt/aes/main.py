@@ -6,11 +6,14 @@
 from itertools import chain
 from random import getrandbits
 
-import matplotlib.pyplot as plt
+from buffers import byte_view, writable_byte_view
 
 from aes.ops import (schedule_keys, add_round_key,
                  shift_rows, mix_columns, sub_bytes,
                  inv_shift_rows, inv_mix_columns, inv_sub_bytes, INT_MATRIX)
+from aes.cipher import AES
+from aes.ttable import KEY_SIZES
+from aes.parallel import crypt_ctr_parallel_into, decrypt_cbc_parallel_into
 
 
 def xor_bytes(a: bytes, b: bytes) -> bytes:
@@ -89,11 +92,147 @@ def _aes128_decrypt(state: bytes, key: bytes) -> bytes:
     return cast_from_matrix(state)
 
 
-def aes_encrypt(data: bytes, key: bytes, mode='CBC', iv=None, ctr_val=None) -> bytes:
-    assert len(key) == 16
+# 'reference' runs the matrix implementation above block by block,
+# 'ttable' runs `AES` with T-table engine and cached key schedule
+# (the only one supporting 192 and 256-bit keys)
+ENGINES = ('reference', 'ttable')
 
+
+def _check_args(key: bytes, mode: str, engine: str):
     if mode not in ("CBC", "CTR"):
         raise AttributeError(f'Unknown mode: {mode}')
+    if engine not in ENGINES:
+        raise AttributeError(f'Unknown engine: {engine}')
+    if engine == 'reference':
+        assert len(key) == 16, "Reference engine supports 16-byte keys only"
+    assert len(key) in KEY_SIZES, "Key must be of 16, 24 or 32 bytes size"
+
+
+def _reference_cbc_encrypt(data: bytes, key: bytes, iv: bytes) -> bytes:
+    res = iv
+    prev = iv
+    for i in range(0, len(data), 16):
+        cur = data[i: i + 16]
+        to_encrypt = xor_bytes(prev, cur)
+        encrypt = _aes128_encrypt(to_encrypt, key)
+        res += encrypt
+        prev = encrypt
+    return res
+
+
+def _reference_ctr_encrypt(data: bytes, key: bytes, iv: int) -> bytes:
+    res = int.to_bytes(iv, 16, 'big')
+    prev = iv
+    for i in range(0, len(data), 16):
+        cur = prev + 1
+        to_encrypt = int.to_bytes(cur, 16, 'big')
+        encrypted_ctr = _aes128_encrypt(to_encrypt, key)
+        encrypted_msg = xor_bytes(encrypted_ctr, data[i: i + 16])
+        res += encrypted_msg
+        prev = cur
+    return res
+
+
+def _reference_cbc_decrypt(data: bytes, key: bytes) -> bytes:
+    iv = data[:16]
+    prev = iv
+    res = b''
+    for i in range(16, len(data), 16):
+        cur = data[i: i + 16]
+        decrypted = _aes128_decrypt(cur, key)
+        msg_i = xor_bytes(prev, decrypted)
+        prev = cur
+        res += msg_i
+    return res
+
+
+def aes_encrypt_into(data, out, key: bytes, mode='CBC', iv=None,
+                     ctr_val=None, workers=1, cache=None) -> int:
+    """
+    Same as `aes_encrypt`, but reads any buffer and writes to writable `out`
+
+    `out` must hold IV/counter block plus data padded to block size.
+    Returns number of bytes written
+    """
+    _check_args(key, mode, 'ttable')
+    src, dst = byte_view(data), writable_byte_view(out)
+    size = -(-len(src) // 16) * 16
+    assert len(dst) >= 16 + size, \
+        f"Output buffer is too small: {len(dst)} < {16 + size}"
+
+    # only the last, partial block is copied for padding
+    aligned = len(src) - len(src) % 16
+    tail = bytes(src[aligned:]) + b'0' * (size - len(src))
+    cipher = AES(key)
+
+    if mode == 'CBC':
+        if not iv:
+            iv = int.to_bytes(getrandbits(128), 16, 'big')
+        dst[:16] = iv
+        cipher.encrypt_into(src[:aligned], dst[16: 16 + aligned], 'CBC', iv=iv)
+        if tail:
+            prev = bytes(dst[aligned: aligned + 16])
+            cipher.encrypt_into(tail, dst[16 + aligned: 16 + size], 'CBC',
+                                iv=prev)
+
+    if mode == 'CTR':
+        if not ctr_val:
+            ctr_val = getrandbits(128)
+        dst[:16] = int.to_bytes(ctr_val, 16, 'big')
+        if cache is not None:
+            cache.crypt_into(key, src[:aligned], dst[16: 16 + aligned],
+                             ctr_val + 1)
+        else:
+            crypt_ctr_parallel_into(key, src[:aligned], dst[16: 16 + aligned],
+                                    ctr_val + 1, workers)
+        if tail:
+            target = dst[16 + aligned: 16 + size]
+            counter = ctr_val + 1 + aligned // 16
+            if cache is not None:
+                cache.crypt_into(key, tail, target, counter)
+            else:
+                cipher.encrypt_into(tail, target, 'CTR', counter=counter)
+    return 16 + size
+
+
+def aes_decrypt_into(data, out, key: bytes, mode='CBC', workers=1,
+                     cache=None) -> int:
+    """
+    Same as `aes_decrypt`, but reads any buffer and writes to writable `out`
+
+    `out` must hold `len(data) - 16` bytes. Returns number of bytes written
+    """
+    assert len(data) % 16 == 0
+    _check_args(key, mode, 'ttable')
+    src = byte_view(data)
+
+    if mode == 'CBC':
+        return decrypt_cbc_parallel_into(key, src[16:], out, bytes(src[:16]),
+                                         workers)
+
+    if mode == 'CTR':
+        ctr_val = int.from_bytes(src[:16], 'big')
+        if cache is not None:
+            return cache.crypt_into(key, src[16:], out, ctr_val + 1)
+        return crypt_ctr_parallel_into(key, src[16:], out, ctr_val + 1,
+                                       workers)
+
+
+def aes_encrypt(data: bytes, key: bytes, mode='CBC', iv=None, ctr_val=None,
+                engine='ttable', workers=1, cache=None) -> bytes:
+    """
+    `workers` > 1 (or None for all cores) enables multi-process CTR for
+    inputs above `aes.parallel.PARALLEL_THRESHOLD`
+
+    `cache` (`aes.keystream_cache.KeystreamCache`) makes CTR reuse
+    keystream of previously processed counter ranges instead of workers
+    """
+    _check_args(key, mode, engine)
+
+    if engine != 'reference':
+        out = bytearray(16 + -(-len(data) // 16) * 16)
+        aes_encrypt_into(data, out, key, mode, iv, ctr_val, workers, cache)
+        return bytes(out)
 
     if len(data) % 16 != 0:
         extra = 16 - (len(data) % 16)
@@ -102,59 +241,43 @@ def aes_encrypt(data: bytes, key: bytes, mode='CBC', iv=None, ctr_val=None) -> b
     if mode == 'CBC':
         if not iv:
             iv = int.to_bytes(getrandbits(128), 16, 'big')
-        res = iv
-        prev = iv
-        for i in range(0, len(data), 16):
-            cur = data[i: i + 16]
-            to_encrypt = xor_bytes(prev, cur)
-            encrypt = _aes128_encrypt(to_encrypt, key)
-            res += encrypt
-            prev = encrypt
-        return res
+        return _reference_cbc_encrypt(data, key, iv)
 
     if mode == 'CTR':
         if not ctr_val:
             iv = getrandbits(128)
-            # iv = int.to_bytes(iv, 16, 'big')
         else:
             iv = ctr_val
-        res = int.to_bytes(iv, 16, 'big')
-        prev = iv
-        for i in range(0, len(data), 16):
-            cur = prev + 1
-            to_encrypt = int.to_bytes(cur, 16, 'big')
-            encrypted_ctr = _aes128_encrypt(to_encrypt, key)
-            encrypted_msg = xor_bytes(encrypted_ctr, data[i: i + 16])
-            res += encrypted_msg
-            prev = cur
-        return res
-
-
-def aes_decrypt(data: bytes, key: bytes, mode='CBC'):
-    assert len(key) == 16
+        return _reference_ctr_encrypt(data, key, iv)
+
+
+def aes_decrypt(data: bytes, key: bytes, mode='CBC', engine='ttable',
+                workers=1, cache=None):
+    """
+    `workers` > 1 (or None for all cores) enables multi-process CBC and CTR
+    for inputs above `aes.parallel.PARALLEL_THRESHOLD`
+
+    `cache` (`aes.keystream_cache.KeystreamCache`) makes CTR reuse
+    keystream of previously processed counter ranges instead of workers
+    """
     assert len(data) % 16 == 0
+    _check_args(key, mode, engine)
 
-    if mode not in ("CBC", "CTR"):
-        raise AttributeError(f'Unknown mode: {mode}')
+    if engine != 'reference':
+        # no IV block to read, same result as the reference engine
+        if not data:
+            return b''
+        out = bytearray(len(data) - 16)
+        aes_decrypt_into(data, out, key, mode, workers, cache)
+        return bytes(out)
 
     if mode == 'CBC':
-        iv = data[:16]
-        prev = iv
-        res = b''
-        for i in range(16, len(data), 16):
-            cur = data[i: i + 16]
-            decrypted = _aes128_decrypt(cur, key)
-            msg_i = xor_bytes(prev, decrypted)
-            prev = cur
-            res += msg_i
-        return res
+        return _reference_cbc_decrypt(data, key)
 
     if mode == 'CTR':
         ctr_val = int.from_bytes(data[:16], 'big')
-        raw_decrypted = aes_encrypt(data[16:], key, 'CTR', ctr_val)
-        decrypted = raw_decrypted[16:]
-        return decrypted
-
+        raw_decrypted = _reference_ctr_encrypt(data[16:], key, ctr_val)
+        return raw_decrypted[16:]
 
 
 if __name__ == '__main__':
@@ -5,12 +5,20 @@
 from typing import List, Iterable
 from itertools import chain
 
-from aes.sbox_builder import build_s_box, build_inv_s_box, mul_in_gf2_8
+from aes.tables import (S_BOX, INV_S_BOX,
+                        MUL2, MUL3, MUL9, MUL11, MUL13, MUL14)
 
 INT_MATRIX = List[List[int]]
 
-s_box = build_s_box()
-inv_s_box = build_inv_s_box()
+s_box = S_BOX
+inv_s_box = INV_S_BOX
+
+# coefficient of MixColumns matrix -> multiplication table
+mul_tables = {
+    0x01: tuple(range(256)),
+    0x02: MUL2, 0x03: MUL3,
+    0x09: MUL9, 0x0B: MUL11, 0x0D: MUL13, 0x0E: MUL14,
+}
 
 
 def xor_sum(data: Iterable[int]):
@@ -46,7 +54,7 @@ def _mix_columns_common(state: INT_MATRIX, mul_matrix: INT_MATRIX) -> INT_MATRIX
     for col in columns:
         cur_col = []
         for row in mul_matrix:
-            values = [mul_in_gf2_8(col[i], row[i]) for i in range(4)]
+            values = [mul_tables[row[i]][col[i]] for i in range(4)]
             cur_col.append(xor_sum(values))
         res_columns.append(cur_col)
     res = list(list(c) for c in zip(*res_columns))
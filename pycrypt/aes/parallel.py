@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Multi-process CTR mode and CBC decryption
+
+Blocks of CTR keystream and of CBC decryption do not depend on each other,
+so the input is split into block-aligned chunks which are processed by a
+process pool. Every chunk carries everything it needs: CTR chunk - its
+first counter block, CBC chunk - the ciphertext block preceding it.
+
+Inputs shorter than `threshold` are processed in the current process.
+Callers processing one input in several calls (e.g. file chunks) pass
+one pool from `make_pool` to all of them instead of starting a pool per
+call.
+"""
+
+import os
+from contextlib import nullcontext
+from typing import List, Tuple
+
+from aes.cipher import AES, BLOCK_SIZE
+
+
+PARALLEL_THRESHOLD = 1 << 20    # bytes
+
+
+def _split(size: int, workers: int) -> List[Tuple[int, int]]:
+    """Splits `size` bytes in at most `workers` block-aligned ranges"""
+    if size == 0:
+        return []
+    n_blocks = -(-size // BLOCK_SIZE)
+    per_worker = -(-n_blocks // workers) * BLOCK_SIZE
+    return [(i, min(i + per_worker, size)) for i in range(0, size, per_worker)]
+
+
+def _ctr_job(args):
+    key, data, counter = args
+    return AES(key).crypt_ctr(data, counter)
+
+
+def _cbc_decrypt_job(args):
+    key, data, iv = args
+    return AES(key).decrypt_cbc(data, iv)
+
+
+def _run(job, tasks, dst, offsets, pool=None):
+    if not tasks:
+        return
+    if pool is not None:
+        for start, res in zip(offsets, pool.map(job, tasks)):
+            dst[start: start + len(res)] = res
+        return
+    # imported here: it pulls in multiprocessing, which is not needed
+    # for inputs below threshold
+    from concurrent.futures import ProcessPoolExecutor
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        for start, res in zip(offsets, pool.map(job, tasks)):
+            dst[start: start + len(res)] = res
+
+
+def _resolve_workers(workers) -> int:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+    return workers
+
+
+def make_pool(workers: int, size: int, threshold: int = None):
+    """
+    Process pool to share between calls processing `size` bytes in total
+
+    Use in `with`, gives None when no call would go parallel
+    """
+    workers = _resolve_workers(workers)
+    if threshold is None:
+        threshold = PARALLEL_THRESHOLD
+    if workers == 1 or size < threshold:
+        return nullcontext()
+    from concurrent.futures import ProcessPoolExecutor
+    return ProcessPoolExecutor(max_workers=workers)
+
+
+def crypt_ctr_parallel_into(key: bytes, data, out, counter: int,
+                            workers: int = None,
+                            threshold: int = PARALLEL_THRESHOLD,
+                            pool=None) -> int:
+    """
+    Parallel equivalent of `AES(key).encrypt_into(data, out, 'CTR', ...)`
+
+    `workers=None` uses all available cores, `pool` from `make_pool`
+    is used instead of a new one. Returns number of bytes written
+    """
+    workers = _resolve_workers(workers)
+    if workers == 1 or len(data) < threshold:
+        return AES(key).encrypt_into(data, out, 'CTR', counter=counter)
+
+    src, dst = AES._buffers(data, out)
+    ranges = _split(len(src), workers)
+    # chunks are copied to tasks before anything is written, so `out`
+    # may be the same buffer as `data`
+    tasks = [(key, bytes(src[start: end]), counter + start // BLOCK_SIZE)
+             for start, end in ranges]
+    _run(_ctr_job, tasks, dst, [start for start, end in ranges], pool)
+    return len(src)
+
+
+def decrypt_cbc_parallel_into(key: bytes, data, out, iv: bytes,
+                              workers: int = None,
+                              threshold: int = PARALLEL_THRESHOLD,
+                              pool=None) -> int:
+    """
+    Parallel equivalent of `AES(key).decrypt_into(data, out, 'CBC', ...)`
+
+    `workers=None` uses all available cores, `pool` from `make_pool`
+    is used instead of a new one. Returns number of bytes written
+    """
+    assert len(data) % BLOCK_SIZE == 0, "Data must be block-aligned"
+    workers = _resolve_workers(workers)
+    if workers == 1 or len(data) < threshold:
+        return AES(key).decrypt_into(data, out, 'CBC', iv=iv)
+
+    src, dst = AES._buffers(data, out)
+    ranges = _split(len(src), workers)
+    tasks = []
+    for start, end in ranges:
+        prev = iv if start == 0 else src[start - BLOCK_SIZE: start]
+        tasks.append((key, bytes(src[start: end]), bytes(prev)))
+    _run(_cbc_decrypt_job, tasks, dst, [start for start, end in ranges],
+         pool)
+    return len(src)
+
+
+def crypt_ctr_parallel(key: bytes, data: bytes, counter: int,
+                       workers: int = None,
+                       threshold: int = PARALLEL_THRESHOLD) -> bytes:
+    """Parallel equivalent of `AES(key).crypt_ctr(data, counter)`"""
+    out = bytearray(len(data))
+    crypt_ctr_parallel_into(key, data, out, counter, workers, threshold)
+    return bytes(out)
+
+
+def decrypt_cbc_parallel(key: bytes, data: bytes, iv: bytes,
+                         workers: int = None,
+                         threshold: int = PARALLEL_THRESHOLD) -> bytes:
+    """Parallel equivalent of `AES(key).decrypt_cbc(data, iv)`"""
+    out = bytearray(len(data))
+    decrypt_cbc_parallel_into(key, data, out, iv, workers, threshold)
+    return bytes(out)
@@ -78,6 +78,43 @@ def build_inv_s_box():
     return inv_s_box
 
 
+def build_log_tables():
+    """Antilog (powers of generator 0x03) and log tables of GF(2^8)"""
+    alog = [0x01]
+    for i in range(254):
+        alog.append(mul_in_gf2_8(alog[-1], 0x03))
+    log = [0] * 256
+    for i, value in enumerate(alog):
+        log[value] = i
+    return alog, log
+
+
+def _format_table(name, values, comment):
+    lines = [f'# {comment}', f'{name} = (']
+    for i in range(0, len(values), 12):
+        row = ', '.join(f'0x{c:02x}' for c in values[i: i + 12])
+        lines.append(f'    {row},')
+    lines.append(')')
+    return '\n'.join(lines)
+
+
+def build_tables_source():
+    """Source of constants shipped in `aes.tables`"""
+    alog, log = build_log_tables()
+    tables = [
+        _format_table('S_BOX', build_s_box(), 'SubBytes substitution'),
+        _format_table('INV_S_BOX', build_inv_s_box(),
+                      'InvSubBytes substitution'),
+        _format_table('ALOG', alog, 'ALOG[i] = 0x03 ** i, generator 0x03'),
+        _format_table('LOG', log,
+                      'LOG[ALOG[i]] = i, LOG[0] is undefined and kept 0'),
+    ]
+    for c in (0x02, 0x03, 0x09, 0x0b, 0x0d, 0x0e):
+        values = [mul_in_gf2_8(x, c) for x in range(256)]
+        tables.append(_format_table(f'MUL{c}', values, f'MUL{c}[x] = 0x{c:02x} * x'))
+    return '\n\n'.join(tables)
+
+
 if __name__ == '__main__':
     s = build_s_box()
     t = build_inv_s_box()
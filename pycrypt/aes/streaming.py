@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Incremental CBC and CTR contexts
+
+hashlib-like API: feed data with `update()` (or `update_into()` to
+encrypt straight into a caller-supplied buffer) as many times as
+needed, then call `finalize()`. Chaining value / counter are carried
+between calls and partial blocks are buffered, so a stream can be
+processed in chunks of any size with bounded memory.
+
+Output has the same format as `aes_encrypt`: IV (CBC) or initial counter
+(CTR) block first, data padded with b'0' to the block size. Decryptors
+accept exactly that format.
+"""
+
+from abc import ABC, abstractmethod
+from random import getrandbits
+from typing import List
+
+from buffers import byte_view, writable_byte_view
+
+from aes.cipher import AES, BLOCK_SIZE
+
+
+def _xor(a, b) -> bytes:
+    res = int.from_bytes(a, 'big') ^ int.from_bytes(b, 'big')
+    return res.to_bytes(len(a), 'big')
+
+
+class _StreamContext(ABC):
+    """Common routine for all contexts: block buffering and output API"""
+
+    def __init__(self, key: bytes):
+        self._cipher = AES(key)
+        self._buffer = b''
+        self._finalized = False
+
+    def _blocks(self, data) -> List[memoryview]:
+        """
+        Joins `data` with buffered bytes and returns block-aligned pieces
+
+        Remainder is buffered until next call
+        """
+        res = []
+        data = memoryview(data)
+        if self._buffer:
+            need = BLOCK_SIZE - len(self._buffer)
+            self._buffer += data[:need]
+            data = data[need:]
+            if len(self._buffer) < BLOCK_SIZE:
+                return res
+            res.append(memoryview(self._buffer))
+            self._buffer = b''
+
+        aligned = len(data) - len(data) % BLOCK_SIZE
+        if aligned:
+            res.append(data[:aligned])
+        self._buffer = bytes(data[aligned:])
+        return res
+
+    @abstractmethod
+    def _output_size(self, n: int) -> int:
+        """Exact number of bytes `update` of `n` bytes produces"""
+
+    @abstractmethod
+    def _update_into(self, data, dst) -> int:
+        """Writes output of `data` to memoryview `dst`, returns its size"""
+
+    @abstractmethod
+    def _finalize(self) -> bytes:
+        """Output of the rest of the stream"""
+
+    def _collect(self, data) -> bytes:
+        out = bytearray(self._output_size(len(data)))
+        n = self._update_into(data, memoryview(out))
+        return bytes(out[:n])
+
+    def update(self, data) -> bytes:
+        assert not self._finalized, "Context is already finalized"
+        return self._collect(byte_view(data))
+
+    def update_into(self, data, buf) -> int:
+        """
+        Same as `update`, but encrypts/decrypts straight into writable
+        buffer `buf`. Returns bytes written
+        """
+        assert not self._finalized, "Context is already finalized"
+        data = byte_view(data)
+        size = self._output_size(len(data))
+        dst = writable_byte_view(buf)
+        assert len(dst) >= size, \
+            f"Output buffer is too small: {len(dst)} < {size}"
+        return self._update_into(data, dst)
+
+    def finalize(self) -> bytes:
+        assert not self._finalized, "Context is already finalized"
+        self._finalized = True
+        return self._finalize()
+
+
+class CBCEncryptor(_StreamContext):
+
+    def __init__(self, key: bytes, iv: bytes = None):
+        super().__init__(key)
+        if not iv:
+            iv = int.to_bytes(getrandbits(128), 16, 'big')
+        assert len(iv) == BLOCK_SIZE, "IV must be of 16 bytes size"
+        self.iv = iv
+        self._prev = iv
+        self._header = iv
+
+    def _output_size(self, n: int) -> int:
+        total = len(self._buffer) + n
+        return len(self._header) + total - total % BLOCK_SIZE
+
+    def _update_into(self, data, dst) -> int:
+        pos = len(self._header)
+        dst[:pos] = self._header
+        self._header = b''
+        for piece in self._blocks(data):
+            end = pos + len(piece)
+            self._cipher.encrypt_into(piece, dst[pos: end], 'CBC',
+                                      iv=self._prev)
+            self._prev = bytes(dst[end - BLOCK_SIZE: end])
+            pos = end
+        return pos
+
+    def _finalize(self) -> bytes:
+        if not self._buffer:
+            return self._collect(b'')
+        return self._collect(b'0' * (BLOCK_SIZE - len(self._buffer)))
+
+
+class CBCDecryptor(_StreamContext):
+
+    def __init__(self, key: bytes):
+        super().__init__(key)
+        self._prev = None
+
+    def _output_size(self, n: int) -> int:
+        total = len(self._buffer) + n
+        aligned = total - total % BLOCK_SIZE
+        if self._prev is None:
+            return max(aligned - BLOCK_SIZE, 0)
+        return aligned
+
+    def _update_into(self, data, dst) -> int:
+        pos = 0
+        for piece in self._blocks(data):
+            if self._prev is None:
+                self._prev = bytes(piece[:BLOCK_SIZE])
+                piece = piece[BLOCK_SIZE:]
+                if not piece:
+                    continue
+            end = pos + len(piece)
+            # read before write, `piece` may be the buffered block
+            prev = bytes(piece[-BLOCK_SIZE:])
+            self._cipher.decrypt_into(piece, dst[pos: end], 'CBC',
+                                      iv=self._prev)
+            self._prev = prev
+            pos = end
+        return pos
+
+    def _finalize(self) -> bytes:
+        assert not self._buffer, "Ciphertext is not block-aligned"
+        return b''
+
+
+class _CTRContext(_StreamContext):
+    """Keystream bookkeeping shared by CTR encryptor and decryptor"""
+
+    def __init__(self, key: bytes):
+        super().__init__(key)
+        self._counter = None
+        # unused tail of the last keystream block
+        self._keystream = b''
+
+    def _crypt_into(self, data, dst) -> int:
+        data = memoryview(data)
+        pos = 0
+        if self._keystream:
+            pos = min(len(self._keystream), len(data))
+            dst[:pos] = _xor(data[:pos], self._keystream[:pos])
+            self._keystream = self._keystream[pos:]
+            data = data[pos:]
+
+        aligned = len(data) - len(data) % BLOCK_SIZE
+        if aligned:
+            self._cipher.encrypt_into(data[:aligned], dst[pos: pos + aligned],
+                                      'CTR', counter=self._counter)
+            self._counter += aligned // BLOCK_SIZE
+            pos += aligned
+
+        tail = data[aligned:]
+        if tail:
+            keystream = self._cipher.ctr_keystream(self._counter, 1)
+            self._counter += 1
+            dst[pos: pos + len(tail)] = _xor(tail, keystream[:len(tail)])
+            self._keystream = keystream[len(tail):]
+            pos += len(tail)
+        return pos
+
+
+class CTREncryptor(_CTRContext):
+
+    def __init__(self, key: bytes, ctr_val: int = None):
+        super().__init__(key)
+        if not ctr_val:
+            ctr_val = getrandbits(128)
+        self.ctr_val = ctr_val
+        self._counter = ctr_val + 1
+        self._header = int.to_bytes(ctr_val, 16, 'big')
+        self._length = 0
+
+    def _output_size(self, n: int) -> int:
+        return len(self._header) + n
+
+    def _update_into(self, data, dst) -> int:
+        pos = len(self._header)
+        dst[:pos] = self._header
+        self._header = b''
+        self._length += len(data)
+        return pos + self._crypt_into(data, dst[pos:])
+
+    def _finalize(self) -> bytes:
+        return self._collect(b'0' * (-self._length % BLOCK_SIZE))
+
+
+class CTRDecryptor(_CTRContext):
+
+    def _output_size(self, n: int) -> int:
+        if self._counter is None:
+            return max(n - (BLOCK_SIZE - len(self._buffer)), 0)
+        return n
+
+    def _update_into(self, data, dst) -> int:
+        if self._counter is None:
+            need = BLOCK_SIZE - len(self._buffer)
+            self._buffer += bytes(data[:need])
+            data = data[need:]
+            if len(self._buffer) < BLOCK_SIZE:
+                return 0
+            self._counter = int.from_bytes(self._buffer, 'big') + 1
+            self._buffer = b''
+        return self._crypt_into(data, dst)
+
+    def _finalize(self) -> bytes:
+        return b''
@@ -0,0 +1,591 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import unittest as ut
+from unittest import mock
+
+from Crypto.Cipher import AES as AES_PCD
+
+from testing import ImportTimeChecks
+from aes import (ttable, batch_np, bitslice, tables, sbox_builder, gcm,
+                 streaming)
+from aes.cipher import AES, AES128
+from aes.streaming import (CBCEncryptor, CBCDecryptor,
+                           CTREncryptor, CTRDecryptor)
+from aes.parallel import (crypt_ctr_parallel, decrypt_cbc_parallel,
+                          crypt_ctr_parallel_into, decrypt_cbc_parallel_into,
+                          make_pool)
+from aes.fileio import encrypt_file, decrypt_file, decrypt_range
+from aes.keystream_cache import KeystreamCache
+from aes.main import (aes_encrypt, aes_decrypt,
+                      aes_encrypt_into, aes_decrypt_into,
+                      _aes128_encrypt, _aes128_decrypt)
+
+
+def rand(n):
+    b = random._urandom(n)
+    return b
+
+
+class TablesTester(ut.TestCase):
+
+    def test_sboxes(self):
+        self.assertEqual(list(tables.S_BOX), sbox_builder.build_s_box())
+        self.assertEqual(list(tables.INV_S_BOX),
+                         sbox_builder.build_inv_s_box())
+
+    def test_source_is_up_to_date(self):
+        with open(tables.__file__) as f:
+            source = f.read()
+        self.assertIn(sbox_builder.build_tables_source(), source)
+
+    def test_gf_mul(self):
+        for i in range(500):
+            a, b = random.randrange(256), random.randrange(256)
+            self.assertEqual(tables.gf_mul(a, b),
+                             sbox_builder.mul_in_gf2_8(a, b))
+
+
+class TTableTester(ut.TestCase):
+
+    # FIPS-197, Appendix C.1
+    fips_key = bytes.fromhex('000102030405060708090a0b0c0d0e0f')
+    fips_plain = bytes.fromhex('00112233445566778899aabbccddeeff')
+    fips_cipher = bytes.fromhex('69c4e0d86a7b0430d8cdb78070b4c55a')
+
+    def test_fips_vector(self):
+        self.assertEqual(ttable.aes128_encrypt(self.fips_plain, self.fips_key),
+                         self.fips_cipher)
+        self.assertEqual(ttable.aes128_decrypt(self.fips_cipher, self.fips_key),
+                         self.fips_plain)
+        for key in (bytearray(self.fips_key), memoryview(self.fips_key)):
+            self.assertEqual(ttable.aes128_encrypt(self.fips_plain, key),
+                             self.fips_cipher)
+            self.assertEqual(ttable.aes128_decrypt(self.fips_cipher, key),
+                             self.fips_plain)
+
+    def test_same_as_reference(self):
+        for i in range(20):
+            block, key = rand(16), rand(16)
+            self.assertEqual(ttable.aes128_encrypt(block, key),
+                             _aes128_encrypt(block, key))
+            self.assertEqual(ttable.aes128_decrypt(block, key),
+                             _aes128_decrypt(block, key))
+
+    def test_fips_long_keys(self):
+        # FIPS-197, Appendix C.2 and C.3
+        vectors = [('000102030405060708090a0b0c0d0e0f1011121314151617',
+                    'dda97ca4864cdfe06eaf70a0ec0d7191'),
+                   ('000102030405060708090a0b0c0d0e0f'
+                    '101112131415161718191a1b1c1d1e1f',
+                    '8ea2b7ca516745bfeafc49904b496089')]
+        for key, ct in vectors:
+            rk = ttable.expand_key(bytes.fromhex(key))
+            self.assertEqual(len(rk), 4 * (ttable.rounds(len(key) // 2) + 1))
+            self.assertEqual(ttable.encrypt_block(self.fips_plain, rk).hex(), ct)
+            drk = ttable.expand_decryption_key(bytes.fromhex(key))
+            self.assertEqual(ttable.decrypt_block(bytes.fromhex(ct), drk),
+                             self.fips_plain)
+
+    def test_key_cache(self):
+        ttable.clear_key_cache()
+        keys = [rand(16) for _ in range(ttable.KEY_CACHE_SIZE + 8)]
+        for key in keys:
+            self.assertEqual(ttable.aes128_encrypt(self.fips_plain, key),
+                             _aes128_encrypt(self.fips_plain, key))
+            self.assertEqual(ttable.aes128_decrypt(self.fips_plain, key),
+                             _aes128_decrypt(self.fips_plain, key))
+        self.assertEqual(len(ttable._schedules), 2 * ttable.KEY_CACHE_SIZE)
+        # only fingerprints are kept, never the keys themselves
+        stored = b''.join(fp for kind, fp in ttable._schedules)
+        for key in keys:
+            self.assertNotIn(key, stored)
+        # evicted keys are expanded again
+        self.assertEqual(ttable.aes128_encrypt(self.fips_plain, keys[0]),
+                         _aes128_encrypt(self.fips_plain, keys[0]))
+        ttable.clear_key_cache()
+        self.assertFalse(ttable._schedules)
+
+
+class CipherTester(ut.TestCase):
+
+    def test_blocks(self):
+        key = rand(16)
+        cipher = AES128(key)
+        reference = AES_PCD.new(key, AES_PCD.MODE_ECB)
+        for i in range(10):
+            block = rand(16)
+            self.assertEqual(cipher.encrypt_block(block),
+                             reference.encrypt(block))
+            self.assertEqual(cipher.decrypt_block(block),
+                             reference.decrypt(block))
+
+    def test_ctr_unaligned(self):
+        key, msg = rand(16), rand(37)
+        cipher = AES128(key)
+        reference = AES_PCD.new(key, AES_PCD.MODE_CTR, nonce=b'',
+                                initial_value=7).encrypt(msg)
+        self.assertEqual(cipher.crypt_ctr(msg, 7), reference)
+        self.assertEqual(cipher.crypt_ctr(reference, 7), msg)
+
+    def test_key_sizes(self):
+        for size in (24, 32):
+            key, iv, msg = rand(size), rand(16), rand(16 * 40)
+            for backend in AES.backends:
+                cipher = AES(key, backend)
+                cbc = AES_PCD.new(key, AES_PCD.MODE_CBC, iv=iv).encrypt(msg)
+                self.assertEqual(cipher.encrypt_cbc(msg, iv), cbc)
+                self.assertEqual(cipher.decrypt_cbc(cbc, iv), msg)
+                ctr = AES_PCD.new(key, AES_PCD.MODE_CTR, nonce=b'',
+                                  initial_value=3).encrypt(msg)
+                self.assertEqual(cipher.crypt_ctr(msg, 3), ctr)
+        self.assertRaises(AssertionError, AES, rand(20))
+
+
+class GCMTester(ut.TestCase):
+
+    def test_tables(self):
+        h = random.getrandbits(128)
+        ghash = gcm.GHash(h)
+        for i in range(20):
+            x = random.getrandbits(128)
+            self.assertEqual(ghash.mul_h(x), gcm.gf128_mul(x, h))
+
+    def test_same_as_pycryptodome(self):
+        key = rand(16)
+        cipher = AES128(key)
+        for iv_size, size, aad_size in ((12, 0, 0), (12, 64, 20),
+                                        (12, 16 * 40 + 7, 3), (8, 33, 0),
+                                        (60, 50, 17)):
+            iv, msg, aad = rand(iv_size), rand(size), rand(aad_size)
+            ct, tag = cipher.encrypt_gcm(msg, iv, aad)
+            reference = AES_PCD.new(key, AES_PCD.MODE_GCM, nonce=iv)
+            reference.update(aad)
+            ref_ct, ref_tag = reference.encrypt_and_digest(msg)
+            self.assertEqual(ct, ref_ct)
+            self.assertEqual(tag, ref_tag)
+            self.assertEqual(cipher.decrypt_gcm(ct, iv, tag, aad), msg)
+
+    def test_counter_wrap(self):
+        # low 32 bits of the counter block wrap, upper bits must stay
+        key, iv, msg = rand(16), rand(60), rand(16 * 5)
+        cipher = AES128(key)
+        j0 = gcm._pre_counter_block(cipher._ghash_tables(), iv)
+        j0 = (j0 & ~0xFFFFFFFF) | 0xFFFFFFFD
+        res = gcm._gctr(cipher, msg, j0)
+        keystream = b''.join(
+            cipher.encrypt_block(((j0 & ~0xFFFFFFFF) |
+                                  ((j0 + i) & 0xFFFFFFFF)).to_bytes(16, 'big'))
+            for i in range(5))
+        self.assertEqual(res, bytes(a ^ b for a, b in zip(msg, keystream)))
+
+    def test_tampering(self):
+        cipher, iv = AES128(rand(16)), rand(12)
+        ct, tag = cipher.encrypt_gcm(b'attack at dawn', iv, b'header')
+        with self.assertRaises(gcm.AuthenticationError):
+            cipher.decrypt_gcm(ct, iv, tag, b'Header')
+        with self.assertRaises(gcm.AuthenticationError):
+            cipher.decrypt_gcm(bytes([ct[0] ^ 1]) + ct[1:], iv, tag, b'header')
+
+
+class BufferTester(ut.TestCase):
+
+    def test_in_place(self):
+        key, iv, msg = rand(16), rand(16), rand(16 * 40)
+        cipher = AES128(key)
+        for mode, params in (('CBC', {'iv': iv}), ('CTR', {'counter': 77})):
+            buf = bytearray(msg)
+            cipher.encrypt_into(buf, buf, mode, **params)
+            self.assertNotEqual(buf, msg)
+            cipher.decrypt_into(memoryview(buf), buf, mode, **params)
+            self.assertEqual(buf, msg)
+
+    def test_same_as_bytes_api(self):
+        key, iv, msg = rand(16), rand(16), rand(16 * 3 + 5)
+        out = bytearray(16 * 5)
+        n = aes_encrypt_into(memoryview(msg), out, key, 'CBC', iv=iv)
+        self.assertEqual(n, 16 * 5)
+        self.assertEqual(out, aes_encrypt(msg, key, 'CBC', iv=iv))
+        plain = bytearray(n - 16)
+        aes_decrypt_into(out, plain, key, 'CBC')
+        self.assertEqual(plain, aes_decrypt(bytes(out), key, 'CBC'))
+
+        n = aes_encrypt_into(bytearray(msg), out, key, 'CTR', ctr_val=3)
+        self.assertEqual(out[:n], aes_encrypt(msg, key, 'CTR', ctr_val=3))
+
+    def test_small_buffer(self):
+        with self.assertRaises(AssertionError):
+            AES128(rand(16)).encrypt_into(rand(32), bytearray(16), 'CTR',
+                                          counter=1)
+
+    def test_strided(self):
+        key, iv, raw = rand(16), rand(16), rand(2 * (16 * 3 + 5))
+        msg, strided = raw[::2], memoryview(raw)[::2]
+        cipher = AES128(key)
+        self.assertEqual(cipher.crypt_ctr(strided, 5), cipher.crypt_ctr(msg, 5))
+        for mode in ('CBC', 'CTR'):
+            ct = aes_encrypt(strided, key, mode, iv=iv, ctr_val=3)
+            self.assertEqual(ct, aes_encrypt(msg, key, mode, iv=iv, ctr_val=3))
+            spread = bytearray(2 * len(ct))
+            spread[::2] = ct
+            out = bytearray(len(ct) - 16)
+            aes_decrypt_into(memoryview(spread)[::2], out, key, mode)
+            self.assertEqual(bytes(out), msg + b'0' * 11)
+        self.assertEqual(feed(CTREncryptor(key, 9), strided, 7),
+                         feed(CTREncryptor(key, 9), msg, 7))
+        with self.assertRaises(AssertionError):
+            cipher.encrypt_into(msg, memoryview(bytearray(2 * len(msg)))[::2],
+                                'CTR', counter=1)
+
+
+class ModesTester(ut.TestCase):
+
+    engines = ['reference', 'ttable']
+
+    def test_cbc(self):
+        key, iv, msg = rand(16), rand(16), rand(64)
+        reference = AES_PCD.new(key, AES_PCD.MODE_CBC, iv=iv).encrypt(msg)
+        for engine in self.engines:
+            ct = aes_encrypt(msg, key, 'CBC', iv=iv, engine=engine)
+            self.assertEqual(ct, iv + reference)
+            self.assertEqual(aes_decrypt(ct, key, 'CBC', engine=engine), msg)
+
+    def test_ctr(self):
+        key, msg = rand(16), rand(64)
+        ctr_val = random.getrandbits(120) + 1
+        for engine in self.engines:
+            ct = aes_encrypt(msg, key, 'CTR', ctr_val=ctr_val, engine=engine)
+            self.assertEqual(aes_decrypt(ct, key, 'CTR', engine=engine), msg)
+        reference = AES_PCD.new(key, AES_PCD.MODE_CTR, nonce=b'',
+                                initial_value=ctr_val + 1).encrypt(msg)
+        self.assertEqual(ct[16:], reference)
+
+    def test_empty(self):
+        for engine in self.engines:
+            for mode in ('CBC', 'CTR'):
+                self.assertEqual(aes_decrypt(b'', rand(16), mode,
+                                             engine=engine), b'')
+
+    def test_unknown_engine(self):
+        with self.assertRaises(AttributeError):
+            aes_encrypt(rand(16), rand(16), engine='foo')
+
+    def test_aes256(self):
+        key, iv, msg = rand(32), rand(16), rand(50)
+        ct = aes_encrypt(msg, key, 'CBC', iv=iv)
+        self.assertEqual(aes_decrypt(ct, key, 'CBC')[:len(msg)], msg)
+        ct = aes_encrypt(msg, key, 'CTR', ctr_val=5)
+        self.assertEqual(aes_decrypt(ct, key, 'CTR')[:len(msg)], msg)
+        with self.assertRaises(AssertionError):
+            aes_encrypt(msg, key, engine='reference')
+
+
+def feed_into(ctx, data, step):
+    buf = bytearray(len(data) + 2 * 16)
+    pos = 0
+    for i in range(0, len(data), step):
+        pos += ctx.update_into(data[i: i + step], memoryview(buf)[pos:])
+    return bytes(buf[:pos]) + ctx.finalize()
+
+
+def feed(ctx, data, step):
+    res = b''
+    for i in range(0, len(data), step):
+        res += ctx.update(data[i: i + step])
+    return res + ctx.finalize()
+
+
+class StreamingTester(ut.TestCase):
+
+    steps = [1, 7, 16, 33, 1000]
+
+    def test_cbc(self):
+        key, iv, msg = rand(16), rand(16), rand(150)
+        reference = aes_encrypt(msg, key, 'CBC', iv=iv)
+        for step in self.steps:
+            ct = feed(CBCEncryptor(key, iv), msg, step)
+            self.assertEqual(ct, reference)
+            pt = feed(CBCDecryptor(key), ct, step)
+            self.assertEqual(pt, aes_decrypt(ct, key, 'CBC'))
+
+    def test_ctr(self):
+        key, msg = rand(16), rand(150)
+        reference = aes_encrypt(msg, key, 'CTR', ctr_val=12345)
+        for step in self.steps:
+            ct = feed(CTREncryptor(key, 12345), msg, step)
+            self.assertEqual(ct, reference)
+            pt = feed(CTRDecryptor(key), ct, step)
+            self.assertEqual(pt, aes_decrypt(ct, key, 'CTR'))
+
+    def test_update_into(self):
+        key, msg = rand(16), rand(64)
+        ctx = CBCEncryptor(key)
+        buf = bytearray(len(msg) + 32)
+        n = ctx.update_into(msg, buf)
+        self.assertEqual(n, len(msg) + 16)
+        self.assertEqual(bytes(buf[:n]) + ctx.finalize(),
+                         aes_encrypt(msg, key, 'CBC', iv=ctx.iv))
+
+        msg = rand(100)
+        for mode, enc, dec in (('CBC', CBCEncryptor, CBCDecryptor),
+                               ('CTR', CTREncryptor, CTRDecryptor)):
+            for step in (1, 7, 16, 33):
+                ctx = enc(key)
+                ct = feed_into(ctx, msg, step)
+                params = {'iv': ctx.iv} if mode == 'CBC' else \
+                    {'ctr_val': ctx.ctr_val}
+                self.assertEqual(ct, aes_encrypt(msg, key, mode, **params))
+                self.assertEqual(feed_into(dec(key), ct, step),
+                                 aes_decrypt(ct, key, mode))
+        with self.assertRaises(AssertionError):
+            CTREncryptor(key).update_into(msg, bytearray(len(msg)))
+
+    def test_incomplete_context(self):
+        class Incomplete(streaming._StreamContext):
+            def _output_size(self, n):
+                return n
+
+        with self.assertRaises(TypeError):
+            Incomplete(rand(16))
+
+
+class ParallelTester(ut.TestCase):
+
+    def test_ctr(self):
+        key, msg = rand(16), rand(16 * 37 + 5)
+        reference = AES128(key).crypt_ctr(msg, 99)
+        for workers in (1, 2, 3):
+            res = crypt_ctr_parallel(key, msg, 99, workers, threshold=0)
+            self.assertEqual(res, reference)
+
+    def test_cbc_decrypt(self):
+        key, iv, ct = rand(16), rand(16), rand(16 * 37)
+        reference = AES128(key).decrypt_cbc(ct, iv)
+        for workers in (1, 2, 3):
+            res = decrypt_cbc_parallel(key, ct, iv, workers, threshold=0)
+            self.assertEqual(res, reference)
+
+    def test_shared_pool(self):
+        key, iv, ct = rand(16), rand(16), rand(16 * 37)
+        out = bytearray(len(ct))
+        with make_pool(2, len(ct), threshold=0) as pool:
+            for start in (0, 16 * 20):
+                chunk = ct[start: start + 16 * 20]
+                crypt_ctr_parallel_into(key, chunk, memoryview(out)[start:],
+                                        1 + start // 16, 2, 0, pool)
+            self.assertEqual(out, AES128(key).crypt_ctr(ct, 1))
+            decrypt_cbc_parallel_into(key, ct, out, iv, 2, 0, pool)
+        self.assertEqual(out, AES128(key).decrypt_cbc(ct, iv))
+
+    def test_empty(self):
+        key, iv = rand(16), rand(16)
+        self.assertEqual(crypt_ctr_parallel(key, b'', 1, 2, threshold=0), b'')
+        self.assertEqual(decrypt_cbc_parallel(key, b'', iv, 2, threshold=0),
+                         b'')
+
+
+@ut.skipUnless(batch_np.available(), 'NumPy is not installed')
+class NumpyTester(ut.TestCase):
+
+    def test_ctr(self):
+        key = rand(16)
+        python, numpy = AES128(key, 'python'), AES128(key, 'numpy')
+        # counter low half wraps around inside the batch
+        for counter in (5, (1 << 64) - 3, (1 << 128) - 2):
+            self.assertEqual(numpy.ctr_keystream(counter, 40),
+                             python.ctr_keystream(counter, 40))
+
+    def test_cbc_decrypt(self):
+        key, iv, ct = rand(16), rand(16), rand(16 * 40)
+        python, numpy = AES128(key, 'python'), AES128(key, 'numpy')
+        self.assertEqual(numpy.decrypt_cbc(ct, iv), python.decrypt_cbc(ct, iv))
+
+
+class BitsliceTester(ut.TestCase):
+
+    def test_sbox_circuit(self):
+        layout = bitslice._layout(16)
+        data = bytes(range(256))
+        planes = bitslice.sub_bytes(bitslice.pack(data, layout), layout.ones)
+        self.assertEqual(bitslice.unpack(planes, layout), bytes(tables.S_BOX))
+
+    def test_blocks(self):
+        key, data = rand(16), rand(16 * 37)
+        ct = bitslice.encrypt_blocks(data, ttable.expand_key(key))
+        self.assertEqual(ct, AES_PCD.new(key, AES_PCD.MODE_ECB).encrypt(data))
+
+    def test_ctr(self):
+        key = rand(16)
+        python = AES128(key, 'python')
+        sliced = AES128(key, 'bitslice')
+        for counter in (5, (1 << 128) - 2):
+            self.assertEqual(sliced.ctr_keystream(counter, 40),
+                             python.ctr_keystream(counter, 40))
+        data = rand(1000)
+        self.assertEqual(sliced.crypt_ctr(data, 7), python.crypt_ctr(data, 7))
+
+
+class KeystreamCacheTester(ut.TestCase):
+
+    def test_same_as_cipher(self):
+        key = rand(32)
+        cache = KeystreamCache(max_bytes=1 << 12, segment_blocks=8)
+        cipher = AES(key)
+        for counter, n_blocks in [(3, 20), (0, 8), (5, 1), ((1 << 128) - 4, 9)]:
+            self.assertEqual(cache.keystream(key, counter, n_blocks),
+                             cipher.ctr_keystream(counter, n_blocks))
+        data = rand(100)
+        self.assertEqual(cache.crypt(key, data, 11), cipher.crypt_ctr(data, 11))
+
+    def test_counters(self):
+        key = rand(16)
+        cache = KeystreamCache(max_bytes=2 * 8 * 16, segment_blocks=8)
+        cache.keystream(key, 0, 16)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (0, 2, 0))
+        cache.keystream(key, 4, 8)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 2, 0))
+        # other key must not reuse keystream, oldest segment is evicted
+        cache.keystream(rand(16), 0, 8)
+        self.assertEqual((cache.hits, cache.misses, cache.evictions), (2, 3, 1))
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 2 * 8 * 16)
+
+    def test_modes(self):
+        key, msg = rand(16), rand(1000)
+        cache = KeystreamCache()
+        ct = aes_encrypt(msg, key, 'CTR', ctr_val=77, cache=cache)
+        self.assertEqual(ct, aes_encrypt(msg, key, 'CTR', ctr_val=77))
+        misses = cache.misses
+        self.assertEqual(aes_decrypt(ct, key, 'CTR', cache=cache)[:1000], msg)
+        self.assertEqual(cache.misses, misses)
+
+
+class FileTester(ut.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.plain = os.path.join(self.dir.name, 'plain')
+        self.encrypted = os.path.join(self.dir.name, 'encrypted')
+        self.decrypted = os.path.join(self.dir.name, 'decrypted')
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def _read(self, path):
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def test_round_trip(self):
+        key, iv = rand(16), rand(16)
+        for size in (0, 5, 16 * 10 + 3):
+            msg = rand(size)
+            with open(self.plain, 'wb') as f:
+                f.write(msg)
+            for mode, params in (('CBC', {'iv': iv}), ('CTR', {'ctr_val': 9})):
+                stats = encrypt_file(self.plain, self.encrypted, key, mode,
+                                     chunk_size=32, **params)
+                self.assertEqual(stats.size, size)
+                ct = self._read(self.encrypted)
+                self.assertEqual(ct, aes_encrypt(msg, key, mode, **params))
+                decrypt_file(self.encrypted, self.decrypted, key, mode,
+                             chunk_size=48)
+                self.assertEqual(self._read(self.decrypted),
+                                 aes_decrypt(ct, key, mode))
+
+    def test_errors(self):
+        key = rand(16)
+        for size in (0, 10, 40):
+            with open(self.encrypted, 'wb') as f:
+                f.write(rand(size))
+            with self.assertRaises(AssertionError):
+                decrypt_file(self.encrypted, self.decrypted, key)
+
+        with open(self.plain, 'wb') as f:
+            f.write(rand(100))
+        encrypt_file(self.plain, self.encrypted, key, 'CTR')
+
+        def fail(key, data, out, *args, **kwargs):
+            view = memoryview(out).cast('B')
+            raise ValueError('worker failed')
+
+        for func, src in ((encrypt_file, self.plain),
+                          (decrypt_file, self.encrypted)):
+            with mock.patch('aes.fileio.crypt_ctr_parallel_into', fail), \
+                    self.assertRaises(ValueError):
+                func(src, self.decrypted, key, 'CTR')
+
+    def test_same_path(self):
+        key, msg = rand(16), rand(100)
+        with open(self.plain, 'wb') as f:
+            f.write(msg)
+        for func in (encrypt_file, decrypt_file):
+            with self.assertRaises(ValueError):
+                func(self.plain, self.plain, key, 'CTR')
+            self.assertEqual(self._read(self.plain), msg)
+
+    def test_shared_pool(self):
+        key, msg = rand(16), rand(100)
+        with open(self.plain, 'wb') as f:
+            f.write(msg)
+        pools = []
+
+        def record(key, data, out, counter, workers, pool=None):
+            pools.append(pool)
+            return AES(key).encrypt_into(data, out, 'CTR', counter=counter)
+
+        with mock.patch('aes.parallel.PARALLEL_THRESHOLD', 0), \
+                mock.patch('aes.fileio.crypt_ctr_parallel_into', record):
+            encrypt_file(self.plain, self.encrypted, key, 'CTR', ctr_val=5,
+                         chunk_size=32, workers=2)
+        self.assertEqual(len(pools), 4)
+        self.assertIsNotNone(pools[0])
+        self.assertTrue(all(pool is pools[0] for pool in pools))
+        self.assertEqual(self._read(self.encrypted),
+                         aes_encrypt(msg, key, 'CTR', ctr_val=5))
+
+    def test_range(self):
+        key, msg = rand(16), rand(200)
+        with open(self.plain, 'wb') as f:
+            f.write(msg)
+        encrypt_file(self.plain, self.encrypted, key, 'CTR')
+        # file keeps b'0' padding up to block size
+        padded = msg + b'0' * 8
+        for offset, length in ((0, 10), (17, 40), (190, 10), (195, 100)):
+            self.assertEqual(decrypt_range(self.encrypted, key, offset, length),
+                             padded[offset: offset + length])
+
+    def test_cli(self):
+        key, msg = rand(16), rand(100)
+        with open(self.plain, 'wb') as f:
+            f.write(msg)
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        for cmd, src, dst in (('encrypt', self.plain, self.encrypted),
+                              ('decrypt', self.encrypted, self.decrypted)):
+            subprocess.run([sys.executable, '-m', 'aes', cmd, '--mode', 'ctr',
+                            '--key', key.hex(), src, dst],
+                           cwd=root, check=True, capture_output=True)
+        self.assertEqual(self._read(self.decrypted)[:len(msg)], msg)
+        proc = subprocess.run([sys.executable, '-m', 'aes', 'encrypt',
+                               '--key', key.hex(), self.plain, '-'],
+                              cwd=root, capture_output=True)
+        self.assertNotEqual(proc.returncode, 0)
+        self.assertFalse(os.path.exists(os.path.join(root, '-')))
+
+
+class ImportTimeTester(ImportTimeChecks, ut.TestCase):
+
+    # generous enough for compiling sources without cached bytecode
+    budget_us = 100_000
+    modules = ['aes.main', 'aes.streaming', 'aes.parallel']
+    heavy = {'numpy', 'matplotlib', 'multiprocessing', 'concurrent.futures'}
+
+
+if __name__ == '__main__':
+    ut.main(verbosity=2)
@@ -0,0 +1,275 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+T-table implementation of AES block transformation
+
+State is kept as four 32-bit column words (first row in the most
+significant byte). SubBytes, ShiftRows and MixColumns of one round are
+merged into four lookups in precomputed tables `Te0..Te3` (`Td0..Td3` for
+decryption), AddRoundKey is a plain xor with a round key word. Tables are
+built on first use.
+
+Decryption uses the equivalent inverse cipher (FIPS-197, 5.3.5), so the
+decryption key schedule has InvMixColumns pre-applied to the inner round
+keys.
+
+Key schedules are flat tuples of 4 * (Nr + 1) words for 128/192/256-bit
+keys and are memoized by key fingerprint, so the round count Nr is the
+only thing block functions need to know about key size.
+"""
+
+import hashlib
+from collections import OrderedDict
+from functools import lru_cache
+from typing import Callable, List, Tuple
+
+from aes.tables import S_BOX as s_box, INV_S_BOX as inv_s_box, gf_mul
+
+
+WORDS = Tuple[int, ...]
+
+KEY_SIZES = (16, 24, 32)
+# number of memoized key schedules of each kind
+KEY_CACHE_SIZE = 64
+
+# (kind, key fingerprint) -> schedule, least recently used first
+_schedules = OrderedDict()
+
+r_cons = [0x01, 0x02, 0x04, 0x08, 0x10, 0x20, 0x40, 0x80, 0x1b, 0x36]
+
+
+def _rotr8(word: int) -> int:
+    return ((word >> 8) | (word << 24)) & 0xFFFFFFFF
+
+
+def _build_tables(sub: List[int], coefs: List[int]):
+    """Builds four tables of column words `coefs * sub[x]` and its rotations"""
+    t0 = []
+    for x in range(256):
+        s = sub[x]
+        word = 0
+        for c in coefs:
+            word = (word << 8) | gf_mul(s, c)
+        t0.append(word)
+    t1 = [_rotr8(w) for w in t0]
+    t2 = [_rotr8(w) for w in t1]
+    t3 = [_rotr8(w) for w in t2]
+    return t0, t1, t2, t3
+
+
+@lru_cache(maxsize=None)
+def enc_tables():
+    """Te0..Te3"""
+    return _build_tables(s_box, [0x02, 0x01, 0x01, 0x03])
+
+
+@lru_cache(maxsize=None)
+def dec_tables():
+    """Td0..Td3"""
+    return _build_tables(inv_s_box, [0x0E, 0x09, 0x0D, 0x0B])
+
+
+def bytes_to_words(block: bytes) -> WORDS:
+    return [int.from_bytes(block[i: i + 4], 'big') for i in range(0, 16, 4)]
+
+
+def words_to_bytes(words: WORDS) -> bytes:
+    return b''.join(w.to_bytes(4, 'big') for w in words)
+
+
+def _sub_word(word: int) -> int:
+    return (s_box[word >> 24] << 24) | \
+           (s_box[(word >> 16) & 0xff] << 16) | \
+           (s_box[(word >> 8) & 0xff] << 8) | \
+           s_box[word & 0xff]
+
+
+def rounds(key_size: int) -> int:
+    """Nr for key of `key_size` bytes"""
+    assert key_size in KEY_SIZES, "Key must be of 16, 24 or 32 bytes size"
+    return key_size // 4 + 6
+
+
+def _fingerprint(key: bytes) -> bytes:
+    return hashlib.sha256(b'pycrypt key schedule\x00' + key).digest()
+
+
+def _memoized(kind: str, key, build: Callable[[bytes], WORDS]) -> WORDS:
+    """
+    LRU of schedules keyed by key fingerprint, as in `keystream_cache`:
+    raw keys are never kept. Schedules are key material all the same,
+    `clear_key_cache` drops them
+    """
+    key = bytes(key)
+    fp = (kind, _fingerprint(key))
+    # pop and insert instead of move_to_end: a concurrent eviction only
+    # makes the schedule to be computed again
+    res = _schedules.pop(fp, None)
+    if res is None:
+        res = build(key)
+    _schedules[fp] = res
+    while len(_schedules) > 2 * KEY_CACHE_SIZE:
+        try:
+            _schedules.popitem(last=False)
+        except KeyError:
+            break
+    return res
+
+
+def clear_key_cache():
+    """Drops all memoized key schedules"""
+    _schedules.clear()
+
+
+def expand_key(key) -> WORDS:
+    """
+    AES key expansion (FIPS-197, 5.2) for Nk = 4, 6, 8
+
+    Returns tuple of 4 * (Nr + 1) round key words. `key` is any bytes-like
+    object, schedules are memoized by its fingerprint
+    """
+    return _memoized('enc', key, _expand_key)
+
+
+def _expand_key(key: bytes) -> WORDS:
+    nk = len(key) // 4
+    total = 4 * (rounds(len(key)) + 1)
+    w = [int.from_bytes(key[i: i + 4], 'big') for i in range(0, len(key), 4)]
+    for i in range(nk, total):
+        temp = w[i - 1]
+        if i % nk == 0:
+            temp = ((temp << 8) | (temp >> 24)) & 0xFFFFFFFF
+            temp = _sub_word(temp) ^ (r_cons[i // nk - 1] << 24)
+        elif nk > 6 and i % nk == 4:
+            temp = _sub_word(temp)
+        w.append(w[i - nk] ^ temp)
+    return tuple(w)
+
+
+def inv_mix_column_word(word: int) -> int:
+    # Td tables already include InvSubBytes, so it is cancelled by s_box
+    td0, td1, td2, td3 = dec_tables()
+    return td0[s_box[word >> 24]] ^ \
+           td1[s_box[(word >> 16) & 0xff]] ^ \
+           td2[s_box[(word >> 8) & 0xff]] ^ \
+           td3[s_box[word & 0xff]]
+
+
+def invert_key_schedule(rk: WORDS) -> WORDS:
+    """
+    Builds decryption schedule of equivalent inverse cipher
+
+    Round keys are reversed and inner ones are passed through InvMixColumns
+    """
+    nr = len(rk) // 4 - 1
+    drk = list(rk[4 * nr: 4 * nr + 4])
+    for r in range(nr - 1, 0, -1):
+        drk.extend(inv_mix_column_word(w) for w in rk[4 * r: 4 * r + 4])
+    drk.extend(rk[:4])
+    return tuple(drk)
+
+
+def expand_decryption_key(key) -> WORDS:
+    """Memoized `invert_key_schedule(expand_key(key))`"""
+    return _memoized('dec', key,
+                     lambda k: invert_key_schedule(expand_key(k)))
+
+
+def encrypt_int(block: int, rk: WORDS) -> int:
+    """Encrypts one block given as 128-bit int with expanded key `rk`"""
+    s0 = (block >> 96) ^ rk[0]
+    s1 = ((block >> 64) & 0xFFFFFFFF) ^ rk[1]
+    s2 = ((block >> 32) & 0xFFFFFFFF) ^ rk[2]
+    s3 = (block & 0xFFFFFFFF) ^ rk[3]
+
+    te0, te1, te2, te3 = enc_tables()
+    nr = len(rk) // 4 - 1
+    k = 4
+    for _ in range(nr - 1):
+        t0 = te0[s0 >> 24] ^ te1[(s1 >> 16) & 0xff] ^ \
+             te2[(s2 >> 8) & 0xff] ^ te3[s3 & 0xff] ^ rk[k]
+        t1 = te0[s1 >> 24] ^ te1[(s2 >> 16) & 0xff] ^ \
+             te2[(s3 >> 8) & 0xff] ^ te3[s0 & 0xff] ^ rk[k + 1]
+        t2 = te0[s2 >> 24] ^ te1[(s3 >> 16) & 0xff] ^ \
+             te2[(s0 >> 8) & 0xff] ^ te3[s1 & 0xff] ^ rk[k + 2]
+        t3 = te0[s3 >> 24] ^ te1[(s0 >> 16) & 0xff] ^ \
+             te2[(s1 >> 8) & 0xff] ^ te3[s2 & 0xff] ^ rk[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+
+    sb = s_box
+    t0 = (sb[s0 >> 24] << 24) | (sb[(s1 >> 16) & 0xff] << 16) | \
+         (sb[(s2 >> 8) & 0xff] << 8) | sb[s3 & 0xff]
+    t1 = (sb[s1 >> 24] << 24) | (sb[(s2 >> 16) & 0xff] << 16) | \
+         (sb[(s3 >> 8) & 0xff] << 8) | sb[s0 & 0xff]
+    t2 = (sb[s2 >> 24] << 24) | (sb[(s3 >> 16) & 0xff] << 16) | \
+         (sb[(s0 >> 8) & 0xff] << 8) | sb[s1 & 0xff]
+    t3 = (sb[s3 >> 24] << 24) | (sb[(s0 >> 16) & 0xff] << 16) | \
+         (sb[(s1 >> 8) & 0xff] << 8) | sb[s2 & 0xff]
+
+    return ((t0 ^ rk[k]) << 96) | ((t1 ^ rk[k + 1]) << 64) | \
+           ((t2 ^ rk[k + 2]) << 32) | (t3 ^ rk[k + 3])
+
+
+def decrypt_int(block: int, drk: WORDS) -> int:
+    """Decrypts one block given as 128-bit int, `drk` from `invert_key_schedule`"""
+    s0 = (block >> 96) ^ drk[0]
+    s1 = ((block >> 64) & 0xFFFFFFFF) ^ drk[1]
+    s2 = ((block >> 32) & 0xFFFFFFFF) ^ drk[2]
+    s3 = (block & 0xFFFFFFFF) ^ drk[3]
+
+    td0, td1, td2, td3 = dec_tables()
+    nr = len(drk) // 4 - 1
+    k = 4
+    for _ in range(nr - 1):
+        t0 = td0[s0 >> 24] ^ td1[(s3 >> 16) & 0xff] ^ \
+             td2[(s2 >> 8) & 0xff] ^ td3[s1 & 0xff] ^ drk[k]
+        t1 = td0[s1 >> 24] ^ td1[(s0 >> 16) & 0xff] ^ \
+             td2[(s3 >> 8) & 0xff] ^ td3[s2 & 0xff] ^ drk[k + 1]
+        t2 = td0[s2 >> 24] ^ td1[(s1 >> 16) & 0xff] ^ \
+             td2[(s0 >> 8) & 0xff] ^ td3[s3 & 0xff] ^ drk[k + 2]
+        t3 = td0[s3 >> 24] ^ td1[(s2 >> 16) & 0xff] ^ \
+             td2[(s1 >> 8) & 0xff] ^ td3[s0 & 0xff] ^ drk[k + 3]
+        s0, s1, s2, s3 = t0, t1, t2, t3
+        k += 4
+
+    isb = inv_s_box
+    t0 = (isb[s0 >> 24] << 24) | (isb[(s3 >> 16) & 0xff] << 16) | \
+         (isb[(s2 >> 8) & 0xff] << 8) | isb[s1 & 0xff]
+    t1 = (isb[s1 >> 24] << 24) | (isb[(s0 >> 16) & 0xff] << 16) | \
+         (isb[(s3 >> 8) & 0xff] << 8) | isb[s2 & 0xff]
+    t2 = (isb[s2 >> 24] << 24) | (isb[(s1 >> 16) & 0xff] << 16) | \
+         (isb[(s0 >> 8) & 0xff] << 8) | isb[s3 & 0xff]
+    t3 = (isb[s3 >> 24] << 24) | (isb[(s2 >> 16) & 0xff] << 16) | \
+         (isb[(s1 >> 8) & 0xff] << 8) | isb[s0 & 0xff]
+
+    return ((t0 ^ drk[k]) << 96) | ((t1 ^ drk[k + 1]) << 64) | \
+           ((t2 ^ drk[k + 2]) << 32) | (t3 ^ drk[k + 3])
+
+
+def encrypt_block(block: bytes, rk: WORDS) -> bytes:
+    """Encrypts one 16-byte block with expanded key `rk`"""
+    res = encrypt_int(int.from_bytes(block, 'big'), rk)
+    return res.to_bytes(16, 'big')
+
+
+def decrypt_block(block: bytes, drk: WORDS) -> bytes:
+    """Decrypts one 16-byte block with `drk` from `invert_key_schedule`"""
+    res = decrypt_int(int.from_bytes(block, 'big'), drk)
+    return res.to_bytes(16, 'big')
+
+
+def aes128_encrypt(state: bytes, key: bytes) -> bytes:
+    """Same contract as reference `_aes128_encrypt`"""
+    assert len(state) == len(key) == 16, \
+           "Chunk and key must be of 16 bytes size"
+    return encrypt_block(state, expand_key(key))
+
+
+def aes128_decrypt(state: bytes, key: bytes) -> bytes:
+    """Same contract as reference `_aes128_decrypt`"""
+    assert len(state) == len(key) == 16, \
+           "Chunk and key must be of 16 bytes size"
+    return decrypt_block(state, expand_decryption_key(key))
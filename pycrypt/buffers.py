@@ -0,0 +1,26 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""Flat byte views of buffers accepted by the cipher and hash APIs"""
+
+
+def byte_view(data) -> memoryview:
+    """
+    Unsigned byte view of any bytes-like `data`
+
+    Casts are restricted to C-contiguous views, so strided input is
+    copied first
+    """
+    view = memoryview(data)
+    if not view.c_contiguous:
+        view = memoryview(view.tobytes())
+    return view.cast('B')
+
+
+def writable_byte_view(out) -> memoryview:
+    """Unsigned byte view of output buffer, which can not be a copy"""
+    view = memoryview(out)
+    assert not view.readonly, "Output buffer must be writable"
+    assert view.c_contiguous, "Output buffer must be contiguous"
+    return view.cast('B')
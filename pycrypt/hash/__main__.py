@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+File hashing tool, `sha256sum` compatible output
+
+Usage (from `pycrypt` directory):
+    python -m hash file1 dir1 ...
+    python -m hash --workers 0 dir > SHA256SUMS
+    python -m hash --check SHA256SUMS
+    cat file | python -m hash
+"""
+
+import argparse
+import sys
+
+from hash.files import (hash_files, hash_stream, verify_checksums,
+                        format_checksum, CHUNK_SIZE)
+
+
+def _build_parser():
+    parser = argparse.ArgumentParser(prog='python -m hash',
+                                     description='SHA-256 of files')
+    parser.add_argument('paths', nargs='*',
+                        help='files or directories, stdin if none')
+    parser.add_argument('-c', '--check', metavar='FILE',
+                        help='verify checksums listed in FILE')
+    parser.add_argument('--workers', type=int, default=1,
+                        help='process pool size, 0 for all cores')
+    parser.add_argument('--chunk-size', type=int, default=CHUNK_SIZE)
+    parser.add_argument('-q', '--quiet', action='store_true',
+                        help='do not print throughput statistics')
+    return parser
+
+
+def cli_main(argv=None) -> int:
+    args = _build_parser().parse_args(argv)
+    workers = args.workers or None
+    failed = 0
+
+    if args.check:
+        checked, stats = verify_checksums(args.check, workers, args.chunk_size)
+        for path, ok in checked:
+            print(f'{path}: {"OK" if ok else "FAILED"}')
+            failed += not ok
+        if failed:
+            print(f'WARNING: {failed} computed checksums did NOT match',
+                  file=sys.stderr)
+    elif not args.paths:
+        digest, stats = hash_stream(sys.stdin.buffer, args.chunk_size)
+        print(format_checksum('-', digest))
+    else:
+        results, stats = hash_files(args.paths, workers, args.chunk_size)
+        for path, res in results:
+            if isinstance(res, OSError):
+                print(f'{path}: {res.strerror}', file=sys.stderr)
+                failed += 1
+            else:
+                print(format_checksum(path, res))
+
+    if not args.quiet:
+        print(f'hashed {stats.files} files, {stats.size} bytes in '
+              f'{stats.seconds:.3f} s ({stats.throughput:.2f} MiB/s)',
+              file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(cli_main())
@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+SHA-256 of files and directories
+
+Files are memory-mapped and fed to the streaming `SHA256` in chunks, so
+memory use does not depend on file size. Many files are hashed
+concurrently by a process pool, one file per task.
+
+Checksum files use `sha256sum` format: `<hex digest>  <path>` per line
+(`*` before the path marks binary mode and is ignored).
+"""
+
+import mmap
+import os
+import time
+from dataclasses import dataclass
+from typing import Iterable, List, Tuple
+
+from hash.sha2 import SHA256
+
+
+CHUNK_SIZE = 1 << 20
+
+
+class ChecksumFormatError(Exception): pass
+
+
+@dataclass
+class HashStats:
+    """Number of hashed files, their total size and time spent"""
+    files: int
+    size: int
+    seconds: float
+
+    @property
+    def throughput(self) -> float:
+        """MiB per second"""
+        if self.seconds == 0:
+            return 0.0
+        return self.size / self.seconds / (1 << 20)
+
+
+def hash_file(path: str, chunk_size: int = CHUNK_SIZE) -> bytes:
+    """SHA-256 digest of file contents"""
+    sha = SHA256()
+    with open(path, 'rb') as f:
+        f.seek(0, 2)
+        if f.tell() == 0:
+            return sha.digest()
+        data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        try:
+            with memoryview(data) as view:
+                for pos in range(0, len(view), chunk_size):
+                    sha.update(view[pos: pos + chunk_size])
+        except BaseException:
+            try:
+                data.close()
+            except BufferError:
+                # views are still referenced from the traceback of the
+                # error, the map is closed once it is garbage collected
+                pass
+            raise
+        data.close()
+    return sha.digest()
+
+
+def hash_stream(stream,
+                chunk_size: int = CHUNK_SIZE) -> Tuple[bytes, HashStats]:
+    """SHA-256 digest of binary stream read to the end and `HashStats`"""
+    start = time.perf_counter()
+    sha = SHA256()
+    size = 0
+    for chunk in iter(lambda: stream.read(chunk_size), b''):
+        sha.update(chunk)
+        size += len(chunk)
+    return sha.digest(), HashStats(1, size, time.perf_counter() - start)
+
+
+def _hash_job(args):
+    path, chunk_size = args
+    try:
+        return hash_file(path, chunk_size), os.path.getsize(path)
+    except OSError as e:
+        return e, 0
+
+
+def collect_files(paths: Iterable[str]) -> List[str]:
+    """Expands directories to the files they contain, recursively"""
+    res = []
+    for path in paths:
+        if not os.path.isdir(path):
+            res.append(path)
+            continue
+        for root, dirs, files in os.walk(path):
+            dirs.sort()
+            res.extend(os.path.join(root, name) for name in sorted(files))
+    return res
+
+
+def _hash_paths(files: List[str], workers, chunk_size):
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+    start = time.perf_counter()
+
+    tasks = [(path, chunk_size) for path in files]
+    if workers == 1 or len(files) < 2:
+        results = [_hash_job(task) for task in tasks]
+    else:
+        # imported here: it pulls in multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            results = list(pool.map(_hash_job, tasks))
+
+    stats = HashStats(len(files), sum(size for _, size in results),
+                      time.perf_counter() - start)
+    return [(path, res) for path, (res, _) in zip(files, results)], stats
+
+
+def hash_files(paths: Iterable[str], workers: int = 1,
+               chunk_size: int = CHUNK_SIZE):
+    """
+    Hashes files (directories are walked recursively)
+
+    Returns list of (path, digest or OSError) in order of `paths` and
+    `HashStats`. `workers=None` uses all available cores
+    """
+    return _hash_paths(collect_files(paths), workers, chunk_size)
+
+
+def parse_checksums(lines: Iterable[str]) -> List[Tuple[str, bytes]]:
+    """Lines of `sha256sum` output -> list of (path, digest)"""
+    res = []
+    for number, line in enumerate(lines, 1):
+        line = line.rstrip('\n')
+        if not line.strip():
+            continue
+        digest, sep, path = line.partition(' ')
+        if not sep or len(digest) != 64 or path[:1] not in (' ', '*'):
+            raise ChecksumFormatError(f'Line {number}: {line!r}')
+        try:
+            res.append((path[1:], bytes.fromhex(digest)))
+        except ValueError:
+            raise ChecksumFormatError(f'Line {number}: {line!r}')
+    return res
+
+
+def verify_checksums(checksum_path: str, workers: int = 1,
+                     chunk_size: int = CHUNK_SIZE):
+    """
+    Checks files listed in `sha256sum`-format file
+
+    Paths are relative to the current directory, as with `sha256sum -c`.
+    Returns list of (path, ok) and `HashStats`
+    """
+    with open(checksum_path, encoding='utf-8') as f:
+        expected = parse_checksums(f)
+    results, stats = _hash_paths([path for path, _ in expected], workers,
+                                 chunk_size)
+    checked = [(path, res == digest)
+               for (path, res), (_, digest) in zip(results, expected)]
+    return checked, stats
+
+
+def format_checksum(path: str, digest: bytes) -> str:
+    return f'{digest.hex()}  {path}'
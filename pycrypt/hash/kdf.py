@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Key derivation: PBKDF2-HMAC-SHA256 (RFC 8018) and HKDF-SHA256 (RFC 5869)
+
+Both are built on `HMAC`, whose key pads are absorbed once into SHA-256
+states. The PBKDF2 iteration loop works on those raw states and on
+digests as 8-word tuples: every iteration MACs a 32-byte value, which
+together with its precomputed padding is one block for the inner and
+one for the outer hash, so an iteration is two compressions and no
+hasher objects or byte conversions.
+
+PBKDF2 output blocks are independent and may be computed by a process
+pool.
+"""
+
+import os
+from struct import Struct
+from typing import List
+
+from hash.py_hmac import HMAC, BLOCK_SIZE_BYTES
+from hash.sha2 import words_32
+
+
+HASH_SIZE = 32
+
+_DIGEST = Struct('>8L')
+
+
+def _pbkdf2_block(keyed: HMAC, salt: bytes, iterations: int,
+                  index: int) -> bytes:
+    """T_index = U_1 ^ U_2 ^ ... ^ U_c"""
+    mac = keyed.copy()
+    mac.update(salt + index.to_bytes(4, 'big'))
+    u = _DIGEST.unpack(mac.digest())
+    r0, r1, r2, r3, r4, r5, r6, r7 = u
+
+    inner, outer = keyed.midstates()
+    prefix = BLOCK_SIZE_BYTES
+    for _ in range(iterations - 1):
+        u = words_32(outer, words_32(inner, u, prefix), prefix)
+        u0, u1, u2, u3, u4, u5, u6, u7 = u
+        r0 ^= u0
+        r1 ^= u1
+        r2 ^= u2
+        r3 ^= u3
+        r4 ^= u4
+        r5 ^= u5
+        r6 ^= u6
+        r7 ^= u7
+    return _DIGEST.pack(r0, r1, r2, r3, r4, r5, r6, r7)
+
+
+def _pbkdf2_job(args) -> bytes:
+    password, salt, iterations, index = args
+    return _pbkdf2_block(HMAC(password), salt, iterations, index)
+
+
+def pbkdf2_hmac_sha256(password: bytes, salt: bytes, iterations: int,
+                       dklen: int = HASH_SIZE, workers: int = 1) -> bytes:
+    """
+    Same as `hashlib.pbkdf2_hmac('sha256', ...)`
+
+    With `workers` > 1 (or None for all cores) output blocks are split
+    between processes
+    """
+    assert iterations >= 1, "Number of iterations must be positive"
+    assert dklen >= 1, "Derived key length must be positive"
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+    n_blocks = -(-dklen // HASH_SIZE)
+
+    if workers == 1 or n_blocks == 1:
+        keyed = HMAC(password)
+        blocks = [_pbkdf2_block(keyed, salt, iterations, i)
+                  for i in range(1, n_blocks + 1)]
+    else:
+        # imported here: it pulls in multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        tasks = [(password, salt, iterations, i)
+                 for i in range(1, n_blocks + 1)]
+        with ProcessPoolExecutor(max_workers=min(workers, n_blocks)) as pool:
+            blocks = list(pool.map(_pbkdf2_job, tasks))
+    return b''.join(blocks)[:dklen]
+
+
+def hkdf_extract(salt: bytes, ikm: bytes) -> bytes:
+    """PRK = HMAC(salt, IKM), empty salt is HashLen zeros"""
+    return HMAC(salt or b'\x00' * HASH_SIZE, ikm).digest()
+
+
+def hkdf_expand(prk: bytes, info: bytes, length: int) -> bytes:
+    """T(i) = HMAC(PRK, T(i - 1) || info || i), key pads absorbed once"""
+    assert 0 < length <= 255 * HASH_SIZE, "Length must be of 1..8160 bytes"
+    keyed = HMAC(prk)
+    blocks: List[bytes] = []
+    prev = b''
+    for i in range(1, -(-length // HASH_SIZE) + 1):
+        mac = keyed.copy()
+        mac.update(prev + info + bytes([i]))
+        prev = mac.digest()
+        blocks.append(prev)
+    return b''.join(blocks)[:length]
+
+
+def hkdf(ikm: bytes, length: int, salt: bytes = b'', info: bytes = b'') -> bytes:
+    return hkdf_expand(hkdf_extract(salt, ikm), info, length)
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Merkle tree hashing over SHA-256
+
+Data is split in fixed-size leaves (the last one may be shorter, empty
+data is one empty leaf). Leaves do not depend on each other, so they are
+hashed by a process pool. Every level pairs nodes of the level below, an
+odd last node is promoted to the next level as is.
+
+Leaf and node hashes are domain-separated with tagged hashes (as in
+BIP-340): `SHA256(SHA256(tag) || SHA256(tag) || msg)`, so a leaf can never
+be confused with an internal node. The 64-byte tag prefix is exactly one
+block, its compressed state is computed once per tag and copied.
+
+The tree keeps all levels, so `update_leaf` recomputes only the hashes
+on the path from the leaf to the root.
+"""
+
+import mmap
+import os
+from functools import lru_cache
+from typing import List
+
+from hash.sha2 import SHA256, sha256_64
+
+
+LEAF_SIZE = 1 << 20
+
+LEAF_TAG = b'pycrypt/merkle/leaf'
+NODE_TAG = b'pycrypt/merkle/node'
+
+
+@lru_cache(maxsize=None)
+def _tag_state(tag: bytes) -> SHA256:
+    tag_hash = SHA256(tag).digest()
+    return SHA256(tag_hash + tag_hash)
+
+
+def tagged_hash(tag: bytes, data) -> bytes:
+    sha = _tag_state(tag).copy()
+    sha.update(data)
+    return sha.digest()
+
+
+def leaf_hash(data) -> bytes:
+    return tagged_hash(LEAF_TAG, data)
+
+
+def node_hash(left: bytes, right: bytes) -> bytes:
+    # tag prefix and both children are two whole blocks
+    state, length = _tag_state(NODE_TAG).midstate()
+    return sha256_64(left + right, state, length)
+
+
+def _split(n_leaves: int, workers: int):
+    """Splits leaves in at most `workers` contiguous ranges"""
+    per_worker = -(-n_leaves // workers)
+    return [(i, min(i + per_worker, n_leaves))
+            for i in range(0, n_leaves, per_worker)]
+
+
+def _hash_leaves(data, start: int, end: int, leaf_size: int) -> List[bytes]:
+    view = memoryview(data)
+    return [leaf_hash(view[i * leaf_size: (i + 1) * leaf_size])
+            for i in range(start, end)]
+
+
+def _bytes_job(args):
+    data, leaf_size = args
+    return _hash_leaves(data, 0, -(-len(data) // leaf_size), leaf_size)
+
+
+def _file_job(args):
+    path, start, end, leaf_size = args
+    with open(path, 'rb') as f, \
+            mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+        return _hash_leaves(data, start, end, leaf_size)
+
+
+def _run(job, tasks) -> List[bytes]:
+    # imported here: it pulls in multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    res = []
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        for hashes in pool.map(job, tasks):
+            res.extend(hashes)
+    return res
+
+
+def _resolve_workers(workers) -> int:
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+    return workers
+
+
+class MerkleTree:
+    """Tree of leaf hashes with all internal levels kept"""
+
+    def __init__(self, leaves: List[bytes], size: int,
+                 leaf_size: int = LEAF_SIZE):
+        assert leaves, "Tree must have at least one leaf"
+        self.leaf_size = leaf_size
+        self.size = size
+        self.levels = [list(leaves)]
+        while len(self.levels[-1]) > 1:
+            prev = self.levels[-1]
+            self.levels.append([self._parent(prev, i)
+                                for i in range(0, len(prev), 2)])
+
+    @staticmethod
+    def _parent(level: List[bytes], i: int) -> bytes:
+        """Parent of nodes `i` and `i + 1` (`i` is even)"""
+        if i + 1 < len(level):
+            return node_hash(level[i], level[i + 1])
+        return level[i]
+
+    @classmethod
+    def from_data(cls, data, leaf_size: int = LEAF_SIZE, workers: int = 1):
+        """Tree of bytes-like `data`, `workers=None` uses all cores"""
+        assert leaf_size > 0
+        workers = _resolve_workers(workers)
+        n_leaves = max(-(-len(data) // leaf_size), 1)
+        if workers == 1 or n_leaves == 1:
+            leaves = _hash_leaves(data, 0, n_leaves, leaf_size)
+        else:
+            view = memoryview(data)
+            tasks = [(bytes(view[start * leaf_size: end * leaf_size]),
+                      leaf_size)
+                     for start, end in _split(n_leaves, workers)]
+            leaves = _run(_bytes_job, tasks)
+        return cls(leaves, len(data), leaf_size)
+
+    @classmethod
+    def from_file(cls, path: str, leaf_size: int = LEAF_SIZE,
+                  workers: int = 1):
+        """
+        Tree of file contents. Every worker maps the file itself, so
+        leaf data is never sent between processes
+        """
+        assert leaf_size > 0
+        workers = _resolve_workers(workers)
+        size = os.path.getsize(path)
+        if size == 0:
+            return cls([leaf_hash(b'')], 0, leaf_size)
+        n_leaves = -(-size // leaf_size)
+        tasks = [(path, start, end, leaf_size)
+                 for start, end in _split(n_leaves, workers)]
+        if workers == 1 or n_leaves == 1:
+            leaves = _file_job(tasks[0])
+        else:
+            leaves = _run(_file_job, tasks)
+        return cls(leaves, size, leaf_size)
+
+    @property
+    def root(self) -> bytes:
+        return self.levels[-1][0]
+
+    def hex_root(self) -> str:
+        return self.root.hex()
+
+    @property
+    def n_leaves(self) -> int:
+        return len(self.levels[0])
+
+    def update_leaf(self, index: int, data) -> bytes:
+        """
+        Replaces data of leaf `index`, recomputes path to the root and
+        returns the new root. Only the last leaf may change its size
+        """
+        assert 0 <= index < self.n_leaves, "Leaf index out of range"
+        last = index == self.n_leaves - 1
+        old_size = self.size - (self.n_leaves - 1) * self.leaf_size \
+            if last else self.leaf_size
+        if last:
+            assert len(data) <= self.leaf_size, "Leaf data is too long"
+        else:
+            assert len(data) == self.leaf_size, \
+                "Only the last leaf may be shorter than leaf size"
+        self.size += len(data) - old_size
+
+        if last and not data and index > 0:
+            # data with no bytes in the last leaf has one leaf less
+            return self._drop_last_leaf()
+
+        self.levels[0][index] = leaf_hash(data)
+        for depth in range(1, len(self.levels)):
+            index //= 2
+            self.levels[depth][index] = \
+                self._parent(self.levels[depth - 1], 2 * index)
+        return self.root
+
+    def _drop_last_leaf(self) -> bytes:
+        """Removes the last leaf, only the rightmost path changes"""
+        self.levels[0].pop()
+        depth = 1
+        while len(self.levels[depth - 1]) > 1:
+            prev, level = self.levels[depth - 1], self.levels[depth]
+            index = (len(prev) - 1) // 2
+            del level[index + 1:]
+            level[index] = self._parent(prev, 2 * index)
+            depth += 1
+        del self.levels[depth:]
+        return self.root
+
+
+def merkle_root(data, leaf_size: int = LEAF_SIZE, workers: int = 1) -> bytes:
+    """Root hash of `data`"""
+    return MerkleTree.from_data(data, leaf_size, workers).root
@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Multi-buffer SHA-256: many independent messages in one pass
+
+Messages are padded and grouped by number of blocks. Every group is
+hashed at once with NumPy: each working variable and message schedule
+word is a uint32 array with one lane per message, so one round of the
+compression function is a few array operations for the whole group
+instead of a few interpreter operations per message. uint32 arithmetic
+wraps modulo 2^32 by itself.
+
+NumPy is optional: without it (and for groups too small to pay off)
+messages are hashed one by one with `SHA256`.
+"""
+
+from typing import Dict, List
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from hash.sha2 import SHA256
+
+
+# Group size (in messages) from which NumPy beats scalar compression.
+# Measured on CPython 3.11 / NumPy 2: scalar ~180 us per block, NumPy
+# ~3.2 ms per block of the group plus ~2 us per message, crossover at
+# ~18 messages
+NUMPY_THRESHOLD = 20
+# messages hashed at once, bounds memory of the message schedule
+BATCH_SIZE = 4096
+
+
+def available() -> bool:
+    return np is not None
+
+
+if np is not None:
+    _H = np.array(SHA256.h, dtype=np.uint32)
+    _K = np.array(SHA256.k, dtype=np.uint32)
+
+
+def _pad(message: bytes) -> bytes:
+    zeros = (55 - len(message)) % 64
+    return message + b'\x80' + b'\x00' * zeros + \
+        (len(message) * 8).to_bytes(8, 'big')
+
+
+def _rotr(x, n: int):
+    return (x >> n) | (x << (32 - n))
+
+
+def _compress(state, block):
+    """
+    `state` is (8, N) and `block` is (16, N) uint32 array, one column per
+    message. Returns new (8, N) state
+    """
+    w = list(block)
+    for i in range(16, 64):
+        x, y = w[i - 15], w[i - 2]
+        s0 = _rotr(x, 7) ^ _rotr(x, 18) ^ (x >> 3)
+        s1 = _rotr(y, 17) ^ _rotr(y, 19) ^ (y >> 10)
+        w.append(w[i - 16] + s0 + w[i - 7] + s1)
+
+    a, b, c, d, e, f, g, h = state
+    for i in range(64):
+        s1 = _rotr(e, 6) ^ _rotr(e, 11) ^ _rotr(e, 25)
+        t1 = h + s1 + (g ^ (e & (f ^ g))) + _K[i] + w[i]
+        s0 = _rotr(a, 2) ^ _rotr(a, 13) ^ _rotr(a, 22)
+        t2 = s0 + ((a & b) | (c & (a | b)))
+        h, g, f, e = g, f, e, d + t1
+        d, c, b, a = c, b, a, t1 + t2
+    return state + np.stack([a, b, c, d, e, f, g, h])
+
+
+def _hash_group(padded: List[bytes]) -> List[bytes]:
+    """Digests of messages padded to the same number of blocks"""
+    count = len(padded)
+    n_words = len(padded[0]) // 4
+    words = np.frombuffer(b''.join(padded), dtype='>u4')
+    # (words of message, message): one lane per message
+    words = words.reshape(count, n_words).T.astype(np.uint32)
+
+    state = np.repeat(_H[:, None], count, axis=1)
+    for start in range(0, n_words, 16):
+        state = _compress(state, words[start: start + 16])
+
+    digests = state.T.astype('>u4').tobytes()
+    return [digests[32 * i: 32 * i + 32] for i in range(count)]
+
+
+def sha256_many(messages, threshold: int = NUMPY_THRESHOLD) -> List[bytes]:
+    """`[SHA256(m).digest() for m in messages]`, vectorized"""
+    messages = [bytes(m) for m in messages]
+    if np is None:
+        return [SHA256(m).digest() for m in messages]
+
+    groups: Dict[int, List[int]] = {}
+    for i, m in enumerate(messages):
+        groups.setdefault((len(m) + 8) // 64 + 1, []).append(i)
+
+    res = [b''] * len(messages)
+    for indices in groups.values():
+        if len(indices) < threshold:
+            for i in indices:
+                res[i] = SHA256(messages[i]).digest()
+            continue
+        for start in range(0, len(indices), BATCH_SIZE):
+            batch = indices[start: start + BATCH_SIZE]
+            digests = _hash_group([_pad(messages[i]) for i in batch])
+            for i, digest in zip(batch, digests):
+                res[i] = digest
+    return res
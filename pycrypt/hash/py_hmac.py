@@ -3,43 +3,153 @@
 # Author: Danil Kovalenko
 
 
-from Crypto.Hash import HMAC, SHA256 as SHA_PCD
+import os
+from typing import List
 
-from hash.sha2 import SHA256
+from hash.sha2 import SHA256, words_32
 
 
 BLOCK_SIZE_BYTES = 512 // 8
 
+# batches with fewer messages are not worth starting a process pool
+PARALLEL_THRESHOLD = 256
+
+IPAD = b'\x36' * BLOCK_SIZE_BYTES
+OPAD = b'\x5c' * BLOCK_SIZE_BYTES
+
 
 def xor_bytes(s, t):
     assert len(s) == len(t)
-    res = b''
-    for i in range(len(s)):
-        x = s[i]
-        y = t[i]
-        res += (x ^ y).to_bytes(1, 'big')
-    return res
+    res = int.from_bytes(s, 'big') ^ int.from_bytes(t, 'big')
+    return res.to_bytes(len(s), 'big')
+
+
+class HMAC:
+    """
+    HMAC-SHA256 (RFC 2104)
+
+    `key ^ ipad` and `key ^ opad` are exactly one block each, so they are
+    absorbed once on construction and only the two SHA-256 states are
+    kept. A message then costs its own blocks plus two finalizations.
+    `copy()` the keyed object to MAC many messages with one key
+    """
+
+    block_size = BLOCK_SIZE_BYTES
+    digest_size = 32
+
+    def __init__(self, key: bytes, msg=b''):
+        if len(key) > BLOCK_SIZE_BYTES:
+            key = SHA256(key).digest()
+        key = bytes(key).ljust(BLOCK_SIZE_BYTES, b'\x00')
+        self._inner = SHA256(xor_bytes(key, IPAD))
+        self._outer = SHA256(xor_bytes(key, OPAD))
+        self.update(msg)
+
+    def update(self, msg):
+        self._inner.update(msg)
+
+    def midstates(self):
+        """
+        Compression states (inner, outer) right after the key pads, for
+        code that runs SHA-256 compression on its own
+        """
+        inner, length = self._inner.midstate()
+        assert length == BLOCK_SIZE_BYTES, "Message data was already absorbed"
+        return inner, self._outer.midstate()[0]
+
+    def copy(self):
+        """Independent HMAC with the same key and absorbed data"""
+        obj = self.__class__.__new__(self.__class__)
+        obj._inner = self._inner.copy()
+        obj._outer = self._outer.copy()
+        return obj
+
+    def digest(self) -> bytes:
+        """MAC of data absorbed so far, object may still be updated"""
+        # outer hash is the pad block plus 32 bytes: one compression
+        outer = words_32(self._outer.midstate()[0], self._inner.final_state(),
+                         BLOCK_SIZE_BYTES)
+        return b''.join(w.to_bytes(4, 'big') for w in outer)
+
+    def hex_digest(self) -> str:
+        return self.digest().hex()
+
+    hexdigest = hex_digest
 
 
 def hmac(data: bytes, key: bytes):
-    ipad = b'\x36' * BLOCK_SIZE_BYTES
-    opad = b'\x5c' * BLOCK_SIZE_BYTES
+    return HMAC(key, data).hex_digest()
+
+
+def _mac_job(args) -> List[bytes]:
+    key, messages = args
+    keyed = HMAC(key)
+    res = []
+    for msg in messages:
+        mac = keyed.copy()
+        mac.update(msg)
+        res.append(mac.digest())
+    return res
+
+
+def hmac_many(key: bytes, messages, workers: int = 1,
+              threshold: int = PARALLEL_THRESHOLD) -> List[bytes]:
+    """
+    MACs (bytes) of all `messages` with one key
 
-    if len(key) > BLOCK_SIZE_BYTES:
-        key = SHA256(key).digest()
-    if len(key) < BLOCK_SIZE_BYTES:
-        key = key.ljust(BLOCK_SIZE_BYTES, b'\x00')
+    Key pads are absorbed once for the whole batch. Batches of at least
+    `threshold` messages are split between `workers` processes
+    (`None` for all cores)
+    """
+    messages = list(messages)
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+    if workers == 1 or len(messages) < threshold:
+        return _mac_job((key, messages))
 
-    x = xor_bytes(key, ipad) + data
-    x = SHA256(x).digest()
-    x = xor_bytes(key, opad) + x
-    return SHA256(x).hex_digest()
+    per_worker = -(-len(messages) // workers)
+    tasks = [(key, [bytes(m) for m in messages[i: i + per_worker]])
+             for i in range(0, len(messages), per_worker)]
+    # imported here: it pulls in multiprocessing
+    from concurrent.futures import ProcessPoolExecutor
+    res = []
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        for macs in pool.map(_mac_job, tasks):
+            res.extend(macs)
+    return res
+
+
+def verify_many(key: bytes, messages, tags, workers: int = 1,
+                threshold: int = PARALLEL_THRESHOLD) -> List[bool]:
+    """
+    Checks `tags` (bytes or hex strings in any case) of `messages`
+
+    Every tag is compared in constant time, the result for each message
+    is returned
+    """
+    from hmac import compare_digest
+    messages, tags = list(messages), list(tags)
+    assert len(messages) == len(tags), "Every message must have a tag"
+    macs = hmac_many(key, messages, workers, threshold)
+    res = []
+    for mac, tag in zip(macs, tags):
+        if isinstance(tag, str):
+            try:
+                tag = bytes.fromhex(tag)
+            except ValueError:
+                res.append(False)
+                continue
+        res.append(compare_digest(mac, tag))
+    return res
 
 
 if __name__ == '__main__':
+    from Crypto.Hash import HMAC as HMAC_PCD, SHA256 as SHA_PCD
+
     secret = b'Swordfish1'
 
-    h = HMAC.new(secret, digestmod=SHA_PCD)
+    h = HMAC_PCD.new(secret, digestmod=SHA_PCD)
     h.update(b'hello')
     print(h.hexdigest())
 
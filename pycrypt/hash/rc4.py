@@ -2,6 +2,25 @@
 # -*-encoding: utf-8-*-
 # Author: Danil Kovalenko
 
+"""
+RC4 stream cipher
+
+`rc4_init` is the key-scheduling algorithm, `rc4_prga` a straightforward
+byte-by-byte generator over its state. `RC4` keeps the state between
+calls and produces keystream in bulk: the PRGA loop runs over locals and
+fills a bytearray, XOR is done on whole chunks as big ints.
+
+RC4 is broken and is here for interoperability with legacy systems only.
+"""
+
+import time
+
+from buffers import byte_view
+
+
+# bytes of keystream produced and xored at once
+CHUNK_SIZE = 1 << 16
+
 
 def rc4_init(k):
     s = list(range(256))
@@ -13,6 +32,89 @@ def rc4_init(k):
     return s
 
 
+def rc4_prga(s):
+    """Endless keystream generator over state `s` from `rc4_init`"""
+    i = j = 0
+    while True:
+        i = (i + 1) % 256
+        j = (j + s[i]) % 256
+        s[i], s[j] = s[j], s[i]
+        yield s[(s[i] + s[j]) % 256]
+
+
+class RC4:
+    """
+    Stateful RC4: consecutive calls continue the same keystream
+
+    `drop` first keystream bytes are discarded (RC4-drop[n]), 768 or 3072
+    is recommended where the peer supports it
+    """
+
+    def __init__(self, key: bytes, drop: int = 0):
+        assert 1 <= len(key) <= 256, "Key must be of 1..256 bytes size"
+        assert drop >= 0
+        # list is faster to index and to assign than bytearray
+        self._s = rc4_init(key)
+        self._i = 0
+        self._j = 0
+        self.keystream(drop)
+
+    def _fill(self, out: bytearray, start: int, end: int):
+        s, i, j = self._s, self._i, self._j
+        for k in range(start, end):
+            i = (i + 1) & 0xff
+            si = s[i]
+            j = (j + si) & 0xff
+            sj = s[j]
+            s[i] = sj
+            s[j] = si
+            out[k] = s[(si + sj) & 0xff]
+        self._i, self._j = i, j
+
+    def keystream(self, n: int) -> bytes:
+        """Next `n` bytes of keystream"""
+        out = bytearray(n)
+        for start in range(0, n, CHUNK_SIZE):
+            self._fill(out, start, min(start + CHUNK_SIZE, n))
+        return bytes(out)
+
+    def iter_keystream(self, chunk_size: int = CHUNK_SIZE):
+        """Endless generator of keystream chunks"""
+        while True:
+            yield self.keystream(chunk_size)
+
+    def crypt(self, data) -> bytes:
+        """Encrypts or decrypts bytes-like `data`"""
+        data = byte_view(data)
+        from_bytes = int.from_bytes
+        res = []
+        for start in range(0, len(data), CHUNK_SIZE):
+            piece = data[start: start + CHUNK_SIZE]
+            x = from_bytes(piece, 'big') ^ \
+                from_bytes(self.keystream(len(piece)), 'big')
+            res.append(x.to_bytes(len(piece), 'big'))
+        return b''.join(res)
+
+
+def benchmark(size: int = 1 << 20, key: bytes = b'Key'):
+    """
+    Throughput (MiB/s) of `RC4.crypt` and of byte-by-byte xor with
+    `rc4_prga` over `size` bytes
+    """
+    data = bytes(size)
+    start = time.perf_counter()
+    RC4(key).crypt(data)
+    bulk = time.perf_counter() - start
+
+    start = time.perf_counter()
+    stream = rc4_prga(rc4_init(key))
+    bytes(b ^ next(stream) for b in data)
+    reference = time.perf_counter() - start
+
+    mib = size / (1 << 20)
+    return mib / bulk, mib / reference
+
+
 if __name__ == '__main__':
     k_ = [0 for i in range(256)]
     k1 = k_.copy()
@@ -32,3 +134,6 @@ if __name__ == '__main__':
     # [0, 35, 3, 43, 9, 11, 65, 229, 32, 36, 134, 98, 59, ...
     # [0, 35, 3, 43, 9, 11, 65, 229, 32, 36, 134, 98, 59, ...
     # 253
+
+    bulk, reference = benchmark()
+    print(f'RC4.crypt: {bulk:.2f} MiB/s, rc4_prga: {reference:.2f} MiB/s')
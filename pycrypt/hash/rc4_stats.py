@@ -0,0 +1,195 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""
+Statistics of RC4 key scheduling over many random keys
+
+KSA runs over a batch of keys at once with NumPy: states are (N, 256)
+uint8 array, one row per key, and every KSA step is a vectorized swap
+over all rows. uint8 arithmetic wraps modulo 256 by itself.
+
+For every key two histograms are accumulated:
+- `first_byte[v]`: first keystream byte is `v`,
+- `state[i, v]`: `S[i] == v` right after KSA.
+
+Work is split in batches of keys, generated from (`seed`, batch index),
+so every batch is reproducible. `KSAStats` of different batches merge by
+addition, which lets batches run in a process pool and lets a long run
+be checkpointed to disk and resumed, skipping finished batches.
+"""
+
+import os
+from dataclasses import dataclass, field
+from typing import Set
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+BATCH_SIZE = 4096
+KEY_LEN = 16
+
+
+class CheckpointError(Exception): pass
+
+
+def available() -> bool:
+    return np is not None
+
+
+def ksa(keys):
+    """(N, L) uint8 keys -> (N, 256) uint8 states after KSA"""
+    n, key_len = keys.shape
+    rows = np.arange(n)
+    s = np.tile(np.arange(256, dtype=np.uint8), (n, 1))
+    j = np.zeros(n, dtype=np.uint8)
+    for i in range(256):
+        si = s[:, i].copy()
+        j += si + keys[:, i % key_len]
+        s[:, i] = s[rows, j]
+        s[rows, j] = si
+    return s
+
+
+def first_bytes(states):
+    """First keystream byte of every state, states are not modified"""
+    rows = np.arange(len(states))
+    # i = 1, j = S[1]; after the swap S[1] = S[j] and S[j] = old S[1]
+    j = states[:, 1]
+    sj = states[rows, j]
+    t = j + sj
+    out = states[rows, t]
+    out = np.where(t == 1, sj, out)
+    return np.where(t == j, j, out)
+
+
+def _new_histogram(*shape):
+    return np.zeros(shape, dtype=np.int64)
+
+
+@dataclass
+class KSAStats:
+    """Mergeable histograms over `keys` keys"""
+    keys: int = 0
+    first_byte: 'np.ndarray' = field(
+        default_factory=lambda: _new_histogram(256))
+    state: 'np.ndarray' = field(
+        default_factory=lambda: _new_histogram(256, 256))
+    done: Set[int] = field(default_factory=set)
+
+    def add_states(self, states):
+        self.keys += len(states)
+        self.first_byte += np.bincount(first_bytes(states), minlength=256)
+        flat = np.arange(256) * 256 + states
+        self.state += np.bincount(flat.ravel(),
+                                  minlength=256 * 256).reshape(256, 256)
+
+    def merge(self, other: 'KSAStats') -> 'KSAStats':
+        """Adds `other` to this one, batches must not overlap"""
+        assert not self.done & other.done, "Batches are counted twice"
+        self.keys += other.keys
+        self.first_byte += other.first_byte
+        self.state += other.state
+        self.done |= other.done
+        return self
+
+    def save(self, path: str, **params):
+        """Writes atomically, so a crash never leaves broken checkpoint"""
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, keys=self.keys, first_byte=self.first_byte,
+                     state=self.state, done=np.array(sorted(self.done)),
+                     **params)
+        os.replace(tmp, path)
+
+    @classmethod
+    def load(cls, path: str, **params) -> 'KSAStats':
+        """Reads checkpoint, `params` must match the saved ones"""
+        with np.load(path) as data:
+            for name, value in params.items():
+                if name not in data or data[name] != value:
+                    raise CheckpointError(
+                        f'Checkpoint {path} was made with other {name}')
+            return cls(int(data['keys']), data['first_byte'], data['state'],
+                       set(int(i) for i in data['done']))
+
+
+def batch_keys(seed: int, index: int, batch_size: int = BATCH_SIZE,
+               key_len: int = KEY_LEN):
+    rng = np.random.default_rng([seed, index])
+    return rng.integers(0, 256, size=(batch_size, key_len), dtype=np.uint8)
+
+
+def batch_stats(args) -> KSAStats:
+    """Histograms of one batch: (seed, index, batch_size, key_len)"""
+    seed, index, batch_size, key_len = args
+    stats = KSAStats(done={index})
+    stats.add_states(ksa(batch_keys(seed, index, batch_size, key_len)))
+    return stats
+
+
+def collect(n_batches: int, batch_size: int = BATCH_SIZE,
+            key_len: int = KEY_LEN, seed: int = 0, workers: int = 1,
+            checkpoint: str = None, checkpoint_every: int = 16) -> KSAStats:
+    """
+    Histograms over `n_batches` batches of random keys
+
+    With `checkpoint` path, finished batches are loaded from it (if it
+    exists) and the file is rewritten every `checkpoint_every` batches
+    and at the end. Checkpoint of a longer run can not be reused.
+    `workers=None` uses all available cores
+    """
+    assert available(), "Statistics engine requires numpy"
+    params = {'batch_size': batch_size, 'key_len': key_len, 'seed': seed}
+    stats = KSAStats()
+    if checkpoint and os.path.exists(checkpoint):
+        stats = KSAStats.load(checkpoint, **params)
+        if stats.done and max(stats.done) >= n_batches:
+            raise CheckpointError(f'Checkpoint {checkpoint} has batches '
+                                  f'beyond {n_batches}')
+    tasks = [(seed, i, batch_size, key_len)
+             for i in range(n_batches) if i not in stats.done]
+
+    if workers is None:
+        workers = os.cpu_count() or 1
+    assert workers >= 1, "Number of workers must be positive"
+
+    def absorb(results):
+        for count, part in enumerate(results, 1):
+            stats.merge(part)
+            if checkpoint and count % checkpoint_every == 0:
+                stats.save(checkpoint, **params)
+
+    if workers == 1 or len(tasks) < 2:
+        absorb(map(batch_stats, tasks))
+    else:
+        # imported here: it pulls in multiprocessing
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            absorb(pool.map(batch_stats, tasks))
+
+    if checkpoint:
+        stats.save(checkpoint, **params)
+    return stats
+
+
+if __name__ == '__main__':
+    import sys
+    import time
+
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    start = time.perf_counter()
+    stats_ = collect(n, workers=None)
+    print(f'{stats_.keys} keys in {time.perf_counter() - start:.2f} s')
+
+    # S[i] == v is expected with probability 1 / 256 for random permutation
+    bias = stats_.state * 256 / stats_.keys
+    for pos, value in zip(*np.unravel_index(np.argsort(bias, axis=None)[-5:],
+                                            bias.shape)):
+        print(f'P(S[{pos}] == {value}) = {bias[pos, value]:.3f} / 256')
+    first = stats_.first_byte * 256 / stats_.keys
+    print(f'most likely first byte: {first.argmax()} '
+          f'({first.max():.3f} / 256)')
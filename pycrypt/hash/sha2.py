@@ -2,9 +2,16 @@
 # -*-encoding: utf-8-*-
 # Author: Danil Kovalenko
 
+from functools import lru_cache
+from struct import Struct
+
+from buffers import byte_view
+
 INT_BIN_SIZE = 32
 MAX_INT = 1 << INT_BIN_SIZE
 
+_BLOCK_WORDS = Struct('>16L')
+
 
 def message_to_int(msg):
     assert isinstance(msg, (str, bytes, int))
@@ -77,52 +84,62 @@ class SHA256(BinOps):
          0x748F82EE, 0x78A5636F, 0x84C87814, 0x8CC70208,
          0x90BEFFFA, 0xA4506CEB, 0xBEF9A3F7, 0xC67178F2]
 
-    DIGEST_SIZE = 512
     MSG_MAX_BIT_LEN = 64
 
-    _input_raw: str
-    _input_int: int
+    block_size = 64
+    digest_size = 32
 
-    def __init__(self, message):
-        self._input_raw = message
-        self._input_int = message_to_int(message)
-        self._digest = 0
-        self._padded = False
+    def __init__(self, message=b''):
+        """
+        Streaming hasher: full 64-byte blocks are compressed as soon as
+        they arrive, only the incomplete tail block is buffered
+        """
+        self._state = tuple(self.h)
+        self._buffer = b''
+        self._length = 0
+        self.update(message)
 
     @classmethod
     def from_int(cls, val):
         """From explicit desired internal value"""
-        obj = cls.__new__(cls)
-        obj._input_int = val
         h = hex(val)[2:]
         if len(h) % 2 != 0:
             h = '0' + h
-        obj._input_raw = bytes.fromhex(h)
-        return obj
-
-    @property
-    def msg_bin_size(self):
-        return self._input_int.bit_length()
-
-    def _pad(self):
-        L = len(self._input_raw) * 8
-        K = (448 - L - 1) % self.DIGEST_SIZE
-        self._input_int <<= 1
-        self._input_int |= 0x1
-
-        self._input_int <<= (K + 64)
-        self._input_int |= L
-        self._padded = True
+        return cls(bytes.fromhex(h))
 
     def update(self, new_message):
-        self._padded = False
-        self._input_raw += new_message
-        self._input_int = int(self._input_raw, 16)
-        self._digest = 0
+        """Absorbs bytes-like object or str (hashed as UTF-8)"""
+        if isinstance(new_message, str):
+            new_message = new_message.encode('utf-8')
+        data = byte_view(new_message)
+        self._length += len(data)
+
+        pos = 0
+        if self._buffer:
+            pos = min(self.block_size - len(self._buffer), len(data))
+            self._buffer += bytes(data[:pos])
+            if len(self._buffer) < self.block_size:
+                return
+            self._state = sha256_compress(self._state, self._buffer)
+            self._buffer = b''
+
+        end = pos + (len(data) - pos) // self.block_size * self.block_size
+        state = self._state
+        for i in range(pos, end, self.block_size):
+            state = sha256_compress(state, data, i)
+        self._state = state
+        self._buffer = bytes(data[end:])
+
+    def copy(self):
+        """Independent hasher with the same state"""
+        obj = self.__class__.__new__(self.__class__)
+        obj._state = self._state
+        obj._buffer = self._buffer
+        obj._length = self._length
+        return obj
 
     def _build_words(self, piece):
-        w = list(self.slices_n(piece, INT_BIN_SIZE))
-        assert len(w) == 16
+        w = [(piece >> (INT_BIN_SIZE * i)) % MAX_INT for i in range(15, -1, -1)]
 
         for i in range(16, 64):
             x = w[i - 15]
@@ -154,40 +171,206 @@ class SHA256(BinOps):
         a = (t1 + t2) % MAX_INT
         return a, b, c, d, e, f, g, h
 
-    def digest(self) -> bytes:
-        self._pad()
-        hash_words = self.h.copy()
-
-        for piece in self.slices_n(self._input_int, self.DIGEST_SIZE):
-            w = self._build_words(piece)
-            variables = self.h.copy()
+    def _compress_reference(self, state, block):
+        """
+        Straightforward compression of one 64-byte block, the reference
+        for `sha256_compress`
+        """
+        w = self._build_words(int.from_bytes(block, 'big'))
+        variables = state
+
+        for i in range(64):
+            variables = self._sha_step(variables, w, i)
+            assert all(c.bit_length() <= 32 for c in variables), \
+                "Overgrowth at iter: " + str(i)
+
+        return tuple((x + y) % MAX_INT for x, y in zip(state, variables))
+
+    def midstate(self):
+        """
+        (state, absorbed length) when whole blocks were absorbed, to
+        continue with fixed-width functions like `sha256_32`
+        """
+        assert not self._buffer, "Absorbed data is not block-aligned"
+        return self._state, self._length
+
+    def final_state(self):
+        """State words after padding, i.e. digest as 8 words"""
+        final = self.copy()
+        len_size = self.MSG_MAX_BIT_LEN // 8
+        zeros = (self.block_size - 1 - len_size - self._length) % self.block_size
+        final.update(b'\x80' + b'\x00' * zeros +
+                     (self._length * 8).to_bytes(len_size, 'big'))
+        assert not final._buffer
+        return final._state
 
-            for i in range(64):
-                variables = self._sha_step(variables, w, i)
-                assert all(c.bit_length() <= 32 for c in variables), \
-                    "Overgrowth at iter: " + str(i)
-
-            hash_words = [(hash_words[i] + variables[i]) % MAX_INT
-                          for i in range(8)]
-            self.h = hash_words
-
-        digest = 0
-        for w in hash_words:
-            digest <<= 32
-            digest = digest | w
-        self._digest = digest
-        return int.to_bytes(digest, 32, 'big')
+    def digest(self) -> bytes:
+        """Digest of data absorbed so far, hasher may still be updated"""
+        return b''.join(w.to_bytes(4, 'big') for w in self.final_state())
 
     def hex_digest(self) -> str:
-        self.digest()
-        return hex(self._digest)[2:]
+        return self.digest().hex()
+
+
+_K = tuple(SHA256.k)
+
+
+def _schedule(w):
+    """16 block words (list, extended in place) -> 64 words `K[i] + W[i]`"""
+    for i in range(16, 64):
+        x = w[i - 15]
+        y = w[i - 2]
+        w.append((w[i - 16] + w[i - 7] +
+                  ((x >> 7 | x << 25) ^ (x >> 18 | x << 14) ^ (x >> 3)) +
+                  ((y >> 17 | y << 15) ^ (y >> 19 | y << 13) ^ (y >> 10))
+                  ) & 0xFFFFFFFF)
+    return [k + x for k, x in zip(_K, w)]
+
+
+def _rounds(state, kw):
+    """
+    64 rounds over pre-expanded schedule `kw` plus feed-forward. Rounds
+    are unrolled by 8 with rotating variable names, so there is no
+    shuffling of the working variables, and words are masked only where
+    the value is reused
+    """
+    a, b, c, d, e, f, g, h = state
+    for i in range(0, 64, 8):
+        h += ((e >> 6 | e << 26) ^ (e >> 11 | e << 21) ^
+              (e >> 25 | e << 7)) + (g ^ (e & (f ^ g))) + kw[i]
+        d = (d + h) & 0xFFFFFFFF
+        h = (h + ((a >> 2 | a << 30) ^ (a >> 13 | a << 19) ^
+              (a >> 22 | a << 10)) + ((a & b) | (c & (a | b)))) & 0xFFFFFFFF
+        g += ((d >> 6 | d << 26) ^ (d >> 11 | d << 21) ^
+              (d >> 25 | d << 7)) + (f ^ (d & (e ^ f))) + kw[i + 1]
+        c = (c + g) & 0xFFFFFFFF
+        g = (g + ((h >> 2 | h << 30) ^ (h >> 13 | h << 19) ^
+              (h >> 22 | h << 10)) + ((h & a) | (b & (h | a)))) & 0xFFFFFFFF
+        f += ((c >> 6 | c << 26) ^ (c >> 11 | c << 21) ^
+              (c >> 25 | c << 7)) + (e ^ (c & (d ^ e))) + kw[i + 2]
+        b = (b + f) & 0xFFFFFFFF
+        f = (f + ((g >> 2 | g << 30) ^ (g >> 13 | g << 19) ^
+              (g >> 22 | g << 10)) + ((g & h) | (a & (g | h)))) & 0xFFFFFFFF
+        e += ((b >> 6 | b << 26) ^ (b >> 11 | b << 21) ^
+              (b >> 25 | b << 7)) + (d ^ (b & (c ^ d))) + kw[i + 3]
+        a = (a + e) & 0xFFFFFFFF
+        e = (e + ((f >> 2 | f << 30) ^ (f >> 13 | f << 19) ^
+              (f >> 22 | f << 10)) + ((f & g) | (h & (f | g)))) & 0xFFFFFFFF
+        d += ((a >> 6 | a << 26) ^ (a >> 11 | a << 21) ^
+              (a >> 25 | a << 7)) + (c ^ (a & (b ^ c))) + kw[i + 4]
+        h = (h + d) & 0xFFFFFFFF
+        d = (d + ((e >> 2 | e << 30) ^ (e >> 13 | e << 19) ^
+              (e >> 22 | e << 10)) + ((e & f) | (g & (e | f)))) & 0xFFFFFFFF
+        c += ((h >> 6 | h << 26) ^ (h >> 11 | h << 21) ^
+              (h >> 25 | h << 7)) + (b ^ (h & (a ^ b))) + kw[i + 5]
+        g = (g + c) & 0xFFFFFFFF
+        c = (c + ((d >> 2 | d << 30) ^ (d >> 13 | d << 19) ^
+              (d >> 22 | d << 10)) + ((d & e) | (f & (d | e)))) & 0xFFFFFFFF
+        b += ((g >> 6 | g << 26) ^ (g >> 11 | g << 21) ^
+              (g >> 25 | g << 7)) + (a ^ (g & (h ^ a))) + kw[i + 6]
+        f = (f + b) & 0xFFFFFFFF
+        b = (b + ((c >> 2 | c << 30) ^ (c >> 13 | c << 19) ^
+              (c >> 22 | c << 10)) + ((c & d) | (e & (c | d)))) & 0xFFFFFFFF
+        a += ((f >> 6 | f << 26) ^ (f >> 11 | f << 21) ^
+              (f >> 25 | f << 7)) + (h ^ (f & (g ^ h))) + kw[i + 7]
+        e = (e + a) & 0xFFFFFFFF
+        a = (a + ((b >> 2 | b << 30) ^ (b >> 13 | b << 19) ^
+              (b >> 22 | b << 10)) + ((b & c) | (d & (b | c)))) & 0xFFFFFFFF
+
+    s0, s1, s2, s3, s4, s5, s6, s7 = state
+    return ((s0 + a) & 0xFFFFFFFF, (s1 + b) & 0xFFFFFFFF,
+            (s2 + c) & 0xFFFFFFFF, (s3 + d) & 0xFFFFFFFF,
+            (s4 + e) & 0xFFFFFFFF, (s5 + f) & 0xFFFFFFFF,
+            (s6 + g) & 0xFFFFFFFF, (s7 + h) & 0xFFFFFFFF)
+
+
+def sha256_compress(state, block, offset=0):
+    """
+    SHA-256 compression function
+
+    Compresses 64 bytes of `block` starting at `offset` into `state`
+    (8 words), returns new state as tuple
+    """
+    return _rounds(state, _schedule(list(_BLOCK_WORDS.unpack_from(block,
+                                                                  offset))))
+
+
+def compress_words(state, words):
+    """`sha256_compress` of a block given as 16 words"""
+    return _rounds(state, _schedule(list(words)))
+
+
+# Fixed-width entry points. Padding of a message of known length is known
+# in advance: for a 32-byte tail it is the last 8 words of the block, for
+# a 64-byte tail it is a whole extra block, whose schedule is expanded
+# once per message length
+
+_H = tuple(SHA256.h)
+_DIGEST_WORDS = Struct('>8L')
+
+
+@lru_cache(maxsize=64)
+def _tail_padding(length: int):
+    """Last 8 words of a block ending a `length`-byte message with 32 bytes"""
+    bits = length * 8
+    return (0x80000000, 0, 0, 0, 0, 0, bits >> 32, bits & 0xFFFFFFFF)
+
+
+@lru_cache(maxsize=64)
+def _padding_block(length: int):
+    """Expanded schedule of padding block of `length`-byte message"""
+    bits = length * 8
+    return _schedule([0x80000000] + [0] * 13 + [bits >> 32, bits & 0xFFFFFFFF])
+
+
+def words_32(state, words, prefix_len: int = 0):
+    """
+    Final state of a message which is `prefix_len` bytes (whole blocks)
+    already compressed into `state` and 8 more words
+    """
+    return _rounds(state, _schedule(list(words) + list(
+        _tail_padding(prefix_len + 32))))
+
+
+def words_64(state, words, prefix_len: int = 0):
+    """Same as `words_32` for 16 more words: block plus padding block"""
+    state = _rounds(state, _schedule(list(words)))
+    return _rounds(state, _padding_block(prefix_len + 64))
+
+
+def sha256_32(data: bytes, state=_H, prefix_len: int = 0) -> bytes:
+    """
+    SHA-256 of exactly 32 bytes (hash of a hash), one compression
+
+    `state` and `prefix_len` continue a midstate of whole blocks
+    """
+    assert len(data) == 32, "Data must be of 32 bytes size"
+    words = _DIGEST_WORDS.unpack(data)
+    return _DIGEST_WORDS.pack(*words_32(state, words, prefix_len))
+
+
+def sha256_64(data: bytes, state=_H, prefix_len: int = 0) -> bytes:
+    """
+    SHA-256 of exactly 64 bytes (pair of hashes), one compression plus
+    one over pre-expanded padding block
+
+    `state` and `prefix_len` continue a midstate of whole blocks
+    """
+    assert len(data) == 64, "Data must be of 64 bytes size"
+    words = _BLOCK_WORDS.unpack(data)
+    return _DIGEST_WORDS.pack(*words_64(state, words, prefix_len))
 
 
 def cli_main():
+    """Hashes stdin in chunks, prints its size and digest"""
     import sys
-    s = sys.stdin.read()
-    print(len(s))
-    print(SHA256(s).hex_digest())
+    sha = SHA256()
+    size = 0
+    for chunk in iter(lambda: sys.stdin.buffer.read(1 << 16), b''):
+        sha.update(chunk)
+        size += len(chunk)
+    print(size)
+    print(sha.hex_digest())
 
 
 if __name__ == '__main__':
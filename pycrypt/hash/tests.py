@@ -3,13 +3,24 @@
 # Author: Danil Kovalenko
 
 
+import os
+import hashlib
 import random
+import subprocess
+import sys
+import tempfile
 import unittest as ut
+from unittest import mock
 
 from Crypto.Hash import SHA256 as SHA_PCD, HMAC
 
-from hash.sha2 import BinOps, SHA256
-from hash.py_hmac import hmac
+from testing import ImportTimeChecks
+from hash.sha2 import BinOps, SHA256, sha256_compress, sha256_32, sha256_64
+from hash.py_hmac import hmac, hmac_many, verify_many, HMAC as PyHMAC
+from hash import multibuffer, merkle, kdf, rc4_stats
+from hash.rc4 import RC4, rc4_init, rc4_prga
+from hash.files import (hash_file, hash_files, verify_checksums,
+                        format_checksum)
 
 
 class BinOpsTester(ut.TestCase):
@@ -62,6 +73,57 @@ class SHATester(ut.TestCase):
             h2 = SHA_PCD.new(c).hexdigest()
             self.assertEqual(h1, h2)
 
+    def test_streaming(self):
+        data = rand(1000)
+        for step in (1, 7, 63, 64, 65, 500):
+            sha = SHA256()
+            for i in range(0, len(data), step):
+                sha.update(data[i: i + step])
+            self.assertEqual(sha.digest(), hashlib.sha256(data).digest())
+
+    def test_strided(self):
+        data = rand(300)
+        self.assertEqual(SHA256(memoryview(data)[::3]).digest(),
+                         hashlib.sha256(data[::3]).digest())
+
+    def test_copy(self):
+        sha = SHA256(b'a' * 100)
+        other = sha.copy()
+        other.update(b'b')
+        self.assertEqual(sha.digest(), hashlib.sha256(b'a' * 100).digest())
+        self.assertEqual(other.digest(),
+                         hashlib.sha256(b'a' * 100 + b'b').digest())
+        # digest does not finalize the hasher
+        sha.update(b'c')
+        self.assertEqual(sha.hex_digest(),
+                         hashlib.sha256(b'a' * 100 + b'c').hexdigest())
+
+    def test_str(self):
+        self.assertEqual(SHA256('привет').digest(),
+                         hashlib.sha256('привет'.encode('utf-8')).digest())
+
+    def test_compress(self):
+        sha = SHA256()
+        for i in range(20):
+            state = tuple(random.getrandbits(32) for j in range(8))
+            block = rand(64)
+            self.assertEqual(sha256_compress(state, block),
+                             sha._compress_reference(state, block))
+        data = rand(128)
+        self.assertEqual(sha256_compress(sha._state, data, 64),
+                         sha._compress_reference(sha._state, data[64:]))
+
+    def test_fixed_width(self):
+        for i in range(5):
+            prefix, data32, data64 = rand(128), rand(32), rand(64)
+            self.assertEqual(sha256_32(data32), hashlib.sha256(data32).digest())
+            self.assertEqual(sha256_64(data64), hashlib.sha256(data64).digest())
+            state, length = SHA256(prefix).midstate()
+            self.assertEqual(sha256_32(data32, state, length),
+                             hashlib.sha256(prefix + data32).digest())
+            self.assertEqual(sha256_64(data64, state, length),
+                             hashlib.sha256(prefix + data64).digest())
+
     def test_hmac(self):
         for i in range(len(self.s)):
             m = k = self.s[i]
@@ -70,7 +132,316 @@ class SHATester(ut.TestCase):
             reference = h.hexdigest()
             self.assertEqual(custom, reference)
 
+    def test_hmac_object(self):
+        for key in (b'', b'key', rand(64), rand(100)):
+            keyed = PyHMAC(key)
+            for msg in (b'', rand(10), rand(200)):
+                mac = keyed.copy()
+                mac.update(msg[:5])
+                mac.update(msg[5:])
+                reference = HMAC.new(key, msg, digestmod=SHA_PCD)
+                self.assertEqual(mac.digest(), reference.digest())
+                self.assertEqual(mac.hexdigest(), reference.hexdigest())
+            # copies do not change the keyed object
+            self.assertEqual(keyed.digest(),
+                             HMAC.new(key, digestmod=SHA_PCD).digest())
+
+
+class MultiBufferTester(ut.TestCase):
+
+    def test_same_as_sha(self):
+        messages = [rand(random.randrange(200)) for i in range(100)]
+        messages += [b'', bytearray(b'abc'), rand(55), rand(56)]
+        reference = [SHA256(m).digest() for m in messages]
+        self.assertEqual(multibuffer.sha256_many(messages), reference)
+        self.assertEqual(multibuffer.sha256_many(messages, threshold=1),
+                         reference)
+
+    @ut.skipUnless(multibuffer.available(), 'NumPy is not installed')
+    def test_batches(self):
+        messages = [rand(10) for i in range(50)]
+        reference = [hashlib.sha256(m).digest() for m in messages]
+        old = multibuffer.BATCH_SIZE
+        multibuffer.BATCH_SIZE = 16
+        try:
+            self.assertEqual(multibuffer.sha256_many(messages), reference)
+        finally:
+            multibuffer.BATCH_SIZE = old
+
+
+class FilesTester(ut.TestCase):
+
+    def setUp(self):
+        self.dir = tempfile.TemporaryDirectory()
+        self.root = self.dir.name
+        self.data = {'a': rand(1000), 'b': b'', os.path.join('sub', 'c'): rand(70)}
+        os.mkdir(os.path.join(self.root, 'sub'))
+        for name, data in self.data.items():
+            with open(os.path.join(self.root, name), 'wb') as f:
+                f.write(data)
+
+    def tearDown(self):
+        self.dir.cleanup()
+
+    def test_hash_file(self):
+        path = os.path.join(self.root, 'a')
+        self.assertEqual(hash_file(path, chunk_size=100),
+                         hashlib.sha256(self.data['a']).digest())
+
+    def test_directory(self):
+        results, stats = hash_files([self.root], workers=2)
+        expected = {os.path.join(self.root, name): hashlib.sha256(data).digest()
+                    for name, data in self.data.items()}
+        self.assertEqual(dict(results), expected)
+        self.assertEqual(stats.files, 3)
+        self.assertEqual(stats.size, 1070)
+
+    def test_verify(self):
+        results, _ = hash_files([self.root])
+        sums = os.path.join(self.root, 'SHA256SUMS')
+        with open(sums, 'w') as f:
+            for path, digest in results:
+                f.write(format_checksum(path, digest) + '\n')
+        with open(os.path.join(self.root, 'a'), 'ab') as f:
+            f.write(b'x')
+        checked, _ = verify_checksums(sums)
+        self.assertEqual([ok for _, ok in checked], [False, True, True])
+
+    def test_cli(self):
+        path = os.path.join(self.root, 'a')
+        cwd = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        proc = subprocess.run([sys.executable, '-m', 'hash', '-q', path],
+                              cwd=cwd, check=True, capture_output=True,
+                              text=True)
+        self.assertEqual(proc.stdout.split(),
+                         [hashlib.sha256(self.data['a']).hexdigest(), path])
+        proc = subprocess.run([sys.executable, '-m', 'hash', '-q'],
+                              input=self.data['a'], cwd=cwd, check=True,
+                              capture_output=True)
+        self.assertEqual(proc.stdout.split(),
+                         [hashlib.sha256(self.data['a']).hexdigest().encode(),
+                          b'-'])
+
+    def test_error_while_hashing(self):
+        class Failing(SHA256):
+            def update(self, data):
+                view = memoryview(data).cast('B')
+                if view:
+                    raise ValueError('hashing failed')
+
+        path = os.path.join(self.root, 'a')
+        with mock.patch('hash.files.SHA256', Failing), \
+                self.assertRaises(ValueError):
+            hash_file(path, chunk_size=4)
+
+
+class MerkleTester(ut.TestCase):
+
+    def test_tagged_hash(self):
+        tag = hashlib.sha256(merkle.LEAF_TAG).digest()
+        self.assertEqual(merkle.leaf_hash(b'abc'),
+                         hashlib.sha256(tag + tag + b'abc').digest())
+
+    def test_structure(self):
+        data = rand(250)
+        leaves = [merkle.leaf_hash(data[i: i + 100]) for i in (0, 100, 200)]
+        root = merkle.node_hash(merkle.node_hash(leaves[0], leaves[1]),
+                                leaves[2])
+        self.assertEqual(merkle.merkle_root(data, leaf_size=100), root)
+        self.assertEqual(merkle.merkle_root(b''), merkle.leaf_hash(b''))
+
+    def test_parallel_and_file(self):
+        data = rand(1000)
+        serial = merkle.merkle_root(data, leaf_size=64)
+        self.assertEqual(merkle.merkle_root(data, 64, workers=2), serial)
+        with tempfile.TemporaryDirectory() as root:
+            path = os.path.join(root, 'data')
+            with open(path, 'wb') as f:
+                f.write(data)
+            for workers in (1, 3):
+                tree = merkle.MerkleTree.from_file(path, 64, workers)
+                self.assertEqual(tree.root, serial)
+
+    def test_update_leaf(self):
+        data = bytearray(rand(1000))
+        tree = merkle.MerkleTree.from_data(data, leaf_size=64)
+        for index, size in ((3, 64), (15, 10), (0, 64)):
+            new = rand(size)
+            data[index * 64: index * 64 + len(new) if index < 15 else None] = new
+            self.assertEqual(tree.update_leaf(index, new),
+                             merkle.merkle_root(data, leaf_size=64))
+            self.assertEqual(tree.size, len(data))
+        with self.assertRaises(AssertionError):
+            tree.update_leaf(1, b'short')
+
+    def test_update_edge_leaves(self):
+        for n_leaves in (1, 2, 3, 5, 8, 9):
+            leaves = [rand(64) for i in range(n_leaves)]
+            tree = merkle.MerkleTree.from_data(b''.join(leaves), 64)
+            updates = [(0, rand(64)), (-1, rand(64)), (-1, rand(7))] + \
+                [(-1, b'')] * n_leaves
+            for index, new in updates:
+                index %= len(leaves)
+                leaves[index] = new
+                if not new and index > 0:
+                    leaves.pop()
+                data = b''.join(leaves)
+                self.assertEqual(tree.update_leaf(index, new),
+                                 merkle.merkle_root(data, 64))
+                self.assertEqual(tree.n_leaves, max(len(leaves), 1))
+                self.assertEqual(tree.size, len(data))
+
+
+class HMACBatchTester(ut.TestCase):
+
+    def test_hmac_many(self):
+        key = rand(20)
+        messages = [rand(random.randrange(100)) for i in range(30)]
+        reference = [HMAC.new(key, m, digestmod=SHA_PCD).digest()
+                     for m in messages]
+        self.assertEqual(hmac_many(key, messages), reference)
+        self.assertEqual(hmac_many(key, messages, workers=2, threshold=10),
+                         reference)
+
+    def test_verify_many(self):
+        key = rand(20)
+        messages = [rand(10) for i in range(5)]
+        tags = hmac_many(key, messages)
+        tags[1] = rand(32)
+        tags[3] = tags[3].hex()
+        tags[4] = tags[4][:16]
+        self.assertEqual(verify_many(key, messages, tags),
+                         [True, False, True, True, False])
+        tags = [t.hex() for t in hmac_many(key, messages)]
+        tags[0] = tags[0].upper()
+        tags[1] = 'ÿ' * 64
+        tags[2] = tags[2][:-1] + 'g'
+        self.assertEqual(verify_many(key, messages, tags),
+                         [True, False, False, True, True])
+
+
+class KDFTester(ut.TestCase):
+
+    def test_pbkdf2(self):
+        for password, salt, iterations, dklen in ((b'password', b'salt', 1, 32),
+                                                  (b'pw', rand(16), 50, 20),
+                                                  (rand(100), b'', 3, 70)):
+            reference = hashlib.pbkdf2_hmac('sha256', password, salt,
+                                            iterations, dklen)
+            self.assertEqual(kdf.pbkdf2_hmac_sha256(password, salt,
+                                                    iterations, dklen),
+                             reference)
+        self.assertEqual(kdf.pbkdf2_hmac_sha256(b'pw', b'salt', 10, 80,
+                                                workers=2),
+                         hashlib.pbkdf2_hmac('sha256', b'pw', b'salt', 10, 80))
+
+    def test_hkdf(self):
+        # RFC 5869, test case 1
+        ikm = b'\x0b' * 22
+        salt = bytes(range(13))
+        info = bytes(range(0xf0, 0xfa))
+        prk = kdf.hkdf_extract(salt, ikm)
+        self.assertEqual(prk.hex(), '077709362c2e32df0ddc3f0dc47bba63'
+                                    '90b6c73bb50f9c3122ec844ad7c2b3e5')
+        self.assertEqual(kdf.hkdf(ikm, 42, salt, info).hex(),
+                         '3cb25f25faacd57a90434f64d0362f2a'
+                         '2d2d0a90cf1a5a4c5db02d56ecc4c5bf'
+                         '34007208d5b887185865')
+
+
+class RC4Tester(ut.TestCase):
+
+    def test_vectors(self):
+        for key, plain, cipher in ((b'Key', b'Plaintext', 'bbf316e8d940af0ad3'),
+                                   (b'Wiki', b'pedia', '1021bf0420'),
+                                   (b'Secret', b'Attack at dawn',
+                                    '45a01f645fc35b383552544b9bf5')):
+            self.assertEqual(RC4(key).crypt(plain).hex(), cipher)
+
+    def test_stream(self):
+        key = rand(16)
+        stream = rc4_prga(rc4_init(key))
+        reference = bytes(next(stream) for i in range(1000))
+        rc4 = RC4(key)
+        self.assertEqual(rc4.keystream(300) + rc4.keystream(700), reference)
+        self.assertEqual(RC4(key, drop=300).keystream(700), reference[300:])
+        chunks = RC4(key).iter_keystream(100)
+        self.assertEqual(b''.join(next(chunks) for i in range(10)), reference)
+
+    def test_crypt(self):
+        key, data = rand(16), rand(1000)
+        rc4 = RC4(key)
+        ct = rc4.crypt(data[:10]) + rc4.crypt(data[10:])
+        self.assertEqual(RC4(key).crypt(ct), data)
+        strided = memoryview(data)[::2]
+        self.assertEqual(RC4(key).crypt(strided),
+                         RC4(key).crypt(bytes(strided)))
+
+
+@ut.skipUnless(rc4_stats.available(), 'NumPy is not installed')
+class RC4StatsTester(ut.TestCase):
+
+    def test_ksa(self):
+        for key_len in (1, 5, 16):
+            keys = rc4_stats.batch_keys(1, key_len, 500, key_len)
+            states = rc4_stats.ksa(keys)
+            first = rc4_stats.first_bytes(states)
+            for key, state, byte in zip(keys, states, first):
+                self.assertEqual(list(state), rc4_init(bytes(key)))
+                self.assertEqual(byte, RC4(bytes(key)).keystream(1)[0])
+
+    def test_histograms(self):
+        stats = rc4_stats.batch_stats((0, 3, 100, 8))
+        keys = rc4_stats.batch_keys(0, 3, 100, 8)
+        first, state = [0] * 256, [[0] * 256 for i in range(256)]
+        for key in keys:
+            first[RC4(bytes(key)).keystream(1)[0]] += 1
+            for pos, value in enumerate(rc4_init(bytes(key))):
+                state[pos][value] += 1
+        self.assertEqual(stats.keys, 100)
+        self.assertEqual(stats.first_byte.tolist(), first)
+        self.assertEqual(stats.state.tolist(), state)
+
+    def test_merge(self):
+        stats = rc4_stats.collect(4, batch_size=64)
+        merged = rc4_stats.batch_stats((0, 0, 64, 16))
+        for i in range(1, 4):
+            merged.merge(rc4_stats.batch_stats((0, i, 64, 16)))
+        self.assertEqual(stats.keys, 256)
+        self.assertEqual(merged.done, {0, 1, 2, 3})
+        self.assertTrue((stats.first_byte == merged.first_byte).all())
+        self.assertTrue((stats.state == merged.state).all())
+        self.assertEqual((stats.state.sum(axis=1) == 256).sum(), 256)
+        parallel = rc4_stats.collect(4, batch_size=64, workers=2)
+        self.assertTrue((stats.state == parallel.state).all())
+
+    def test_checkpoint(self):
+        reference = rc4_stats.collect(6, batch_size=32)
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'ksa.npz')
+            partial = rc4_stats.collect(2, batch_size=32, checkpoint=path)
+            self.assertEqual(partial.done, {0, 1})
+            resumed = rc4_stats.collect(6, batch_size=32, checkpoint=path,
+                                        checkpoint_every=1)
+            self.assertEqual(rc4_stats.KSAStats.load(path).done,
+                             set(range(6)))
+            with self.assertRaises(rc4_stats.CheckpointError):
+                rc4_stats.collect(6, batch_size=32, seed=1, checkpoint=path)
+            with self.assertRaises(rc4_stats.CheckpointError):
+                rc4_stats.collect(2, batch_size=32, checkpoint=path)
+            self.assertEqual(rc4_stats.KSAStats.load(path).done,
+                             set(range(6)))
+        self.assertEqual(resumed.keys, reference.keys)
+        self.assertTrue((resumed.state == reference.state).all())
+        self.assertTrue((resumed.first_byte == reference.first_byte).all())
+
+
+class ImportTimeTester(ImportTimeChecks, ut.TestCase):
 
+    # generous enough for compiling sources without cached bytecode
+    budget_us = 50_000
+    modules = ['hash.sha2', 'hash.py_hmac']
+    heavy = {'Crypto', 'numpy', 'multiprocessing', 'concurrent.futures'}
 
 
 if __name__ == '__main__':
@@ -3,8 +3,8 @@
 # Author: Danil Kovalenko
 
 
-from rsa_init import init_rsa
-from rsa_main import rsa_encode, rsa_decode, rsa_oaep_decode, rsa_oaep_encode
+from rsa.rsa_init import init_rsa
+from rsa.rsa_main import rsa_encode, rsa_decode, rsa_oaep_decode, rsa_oaep_encode
 
 
 __all__ = ['init_rsa', 'rsa_encode',
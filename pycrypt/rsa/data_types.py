@@ -2,6 +2,7 @@
 # -*-encoding: utf-8-*-
 # Author: Danil Kovalenko
 
+import typing as tp
 from dataclasses import dataclass
 
 from serialization import Serializable
@@ -15,15 +16,31 @@ class PublicKey(Serializable):
 
     @property
     def modulus_bin_size(self):
-        return len(bin(self.n[2:]))
+        return self.n.bit_length()
 
 
 @dataclass
 class PrivateKey(Serializable):
-    """Struct for holding RSA private key"""
+    """
+    Struct for holding RSA private key
+
+    Optionally carries public exponent (for blinding) and CRT components
+    as in PKCS #1: primes `p`, `q`, `dP = d mod (p - 1)`,
+    `dQ = d mod (q - 1)` and `qInv = q^-1 mod p`
+    """
     d: int
     n: int
+    e: tp.Optional[int] = None
+    p: tp.Optional[int] = None
+    q: tp.Optional[int] = None
+    dP: tp.Optional[int] = None
+    dQ: tp.Optional[int] = None
+    qInv: tp.Optional[int] = None
 
     @property
     def modulus_bin_size(self):
-        return len(bin(self.n[2:]))
+        return self.n.bit_length()
+
+    @property
+    def has_crt(self) -> bool:
+        return None not in (self.p, self.q, self.dP, self.dQ, self.qInv)
@@ -22,7 +22,11 @@ def init_rsa(n: int) -> tp.Tuple[PublicKey, PrivateKey]:
     d = inv_mod(e, euler_phi(p, q))
 
     N = p*q
-    return PublicKey(e, N), PrivateKey(d, N)
+    # CRT components, see `rsa_decode`
+    dP = d % (p - 1)
+    dQ = d % (q - 1)
+    qInv = inv_mod(q, p)
+    return PublicKey(e, N), PrivateKey(d, N, e, p, q, dP, dQ, qInv)
 
 
 def init_rsa_and_dump(n: int, out_dir: str):
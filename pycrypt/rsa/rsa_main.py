@@ -5,7 +5,7 @@
 from math import log, ceil
 
 from rsa.data_types import PublicKey, PrivateKey
-from rsa.utils import bin_pow_mod, i2osp, osp2i, mgf1, xor
+from rsa.utils import bin_pow_mod, i2osp, osp2i, mgf1, xor, xgcd
 from rsa.const import RSA_MODULO_OCTETS
 
 import secrets
@@ -22,10 +22,45 @@ def rsa_encode(m: int, pub_key: PublicKey):
     return bin_pow_mod(m, pub_key.e, pub_key.n)
 
 
-def rsa_decode(c: int, priv_key: PrivateKey):
+def _crt_pow(c: int, priv_key: PrivateKey) -> int:
+    """
+    c^d mod n with Garner's recombination: two exponentiations with half
+    size modulus and exponent
+    """
+    p, q = priv_key.p, priv_key.q
+    m1 = bin_pow_mod(c % p, priv_key.dP, p)
+    m2 = bin_pow_mod(c % q, priv_key.dQ, q)
+    h = priv_key.qInv * (m1 - m2) % p
+    return m2 + h * q
+
+
+def _private_pow(c: int, priv_key: PrivateKey) -> int:
+    if priv_key.has_crt:
+        return _crt_pow(c, priv_key)
+    return bin_pow_mod(c, priv_key.d, priv_key.n)
+
+
+def rsa_decode(c: int, priv_key: PrivateKey, blinding: bool = False):
+    """
+    Uses CRT components of the key when present, (d, n) otherwise.
+
+    `blinding` randomizes the exponentiation input as `c * r^e`, so its
+    timing does not depend on `c`. Requires `e` in the private key
+    """
     assert c < priv_key.n, \
         f"Ciphertext too long. Max bit length: {priv_key.modulus_bin_size}"
-    return bin_pow_mod(c, priv_key.d, priv_key.n)
+    if not blinding:
+        return _private_pow(c, priv_key)
+
+    assert priv_key.e is not None, "Blinding requires public exponent"
+    n = priv_key.n
+    while True:
+        r = secrets.randbelow(n - 2) + 2
+        g, r_inv, _ = xgcd(r, n)
+        if g == 1:
+            break
+    m = _private_pow(c * bin_pow_mod(r, priv_key.e, n) % n, priv_key)
+    return m * r_inv % n
 
 
 def rsa_oaep_encode(m: int, pub_key: PublicKey, l: str = ''):
@@ -2,7 +2,9 @@
 # -*-encoding: utf-8-*-
 # Author: Danil Kovalenko
 
+import os
 import random
+import tempfile
 import unittest as ut
 from itertools import chain
 
@@ -87,6 +89,43 @@ class IsPrimeTester(ut.TestCase):
         self.assertEqual(m_prime, m, msg=f'RSA Dec(Enc(m)) != m')
 
 
+class CRTTester(ut.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.pub, cls.priv = rsa_init.init_rsa(1024)
+
+    def test_components(self):
+        priv = self.priv
+        self.assertTrue(priv.has_crt)
+        self.assertEqual(priv.p * priv.q, priv.n)
+        self.assertEqual(priv.dP, priv.d % (priv.p - 1))
+        self.assertEqual(priv.dQ, priv.d % (priv.q - 1))
+        self.assertEqual(priv.qInv * priv.q % priv.p, 1)
+
+    def test_decode(self):
+        plain = dt.PrivateKey(self.priv.d, self.priv.n)
+        self.assertFalse(plain.has_crt)
+        for i in range(5):
+            m = random.randrange(self.pub.n)
+            c = rsa_main.rsa_encode(m, self.pub)
+            self.assertEqual(rsa_main.rsa_decode(c, self.priv), m)
+            self.assertEqual(rsa_main.rsa_decode(c, plain), m)
+            self.assertEqual(rsa_main.rsa_decode(c, self.priv, blinding=True),
+                             m)
+        with self.assertRaises(AssertionError):
+            rsa_main.rsa_decode(c, plain, blinding=True)
+
+    def test_serialization(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'key')
+            self.priv.serialize(path)
+            self.assertEqual(dt.PrivateKey.deserialize(path), self.priv)
+            plain = dt.PrivateKey(self.priv.d, self.priv.n)
+            plain.serialize(path)
+            self.assertEqual(dt.PrivateKey.deserialize(path), plain)
+
+
 if __name__ == '__main__':
     # print(rsa_u.is_prime(1997))
     ut.main(verbosity=2)
\ No newline at end of file
@@ -30,7 +30,19 @@ def osp2i(s: str) -> int:
     return int(s, 16)
 
 
-def mgf1(input_str: str, length: int, h=lambda s: SHA256(s).hex_digest()):
+def mgf1(input_str: str, length: int, h=None):
+    """
+    `h` hashes str to hex str, SHA-256 by default. The default absorbs
+    `input_str` once and only finishes a copy of that state per counter
+    """
+    if h is None:
+        prefix = SHA256(input_str)
+
+        def h(s):
+            sha = prefix.copy()
+            sha.update(s[len(input_str):])
+            return sha.hex_digest()
+
     counter = 0
     output = ''
     while len(output) < length:
@@ -86,13 +98,16 @@ def is_prime(p: int) -> bool:
 
 
 def xgcd(a: int, b: int):
-    """Extended Euqlidean algorithm"""
-    if a == 0:
-        return b, 0, 1
-    gcd, x1, y1 = xgcd(b % a, a)
-    x = y1 - (b // a) * x1
-    y = x1
-    return gcd, x, y
+    """
+    Extended Euqlidean algorithm. Iterative: recursion depth would reach
+    the interpreter limit on 2048-bit values
+    """
+    x0, y0, x1, y1 = 1, 0, 0, 1
+    while a != 0:
+        q = b // a
+        a, b = b % a, a
+        x0, y0, x1, y1 = y0 - q * x0, x0, y1 - q * x1, x1
+    return b, y0, y1
 
 
 def inv_mod(c: int, m: int) -> int:
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+# -*-encoding: utf-8-*-
+# Author: Danil Kovalenko
+
+"""Test helpers shared by package test suites"""
+
+import os
+import subprocess
+import sys
+
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+
+
+def cold_import(module: str):
+    """
+    Imports `module` in a fresh interpreter with `-X importtime`
+
+    Returns cumulative import time of `module` in microseconds and the set
+    of all modules imported along with it
+    """
+    proc = subprocess.run([sys.executable, '-X', 'importtime',
+                           '-c', f'import {module}'],
+                          cwd=ROOT, capture_output=True, text=True, check=True)
+    cumulative, imported = None, set()
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, total, name = line.split('|')
+        imported.add(name.strip())
+        if name.strip() == module:
+            cumulative = int(total)
+    return cumulative, imported
+
+
+class ImportTimeChecks:
+    """
+    Mixin for `unittest.TestCase`: `modules` import within `budget_us`
+    microseconds and pull in none of `heavy` modules
+    """
+
+    budget_us: int
+    modules = []
+    heavy = set()
+
+    def test_import_time(self):
+        for module in self.modules:
+            best = min(cold_import(module)[0] for i in range(3))
+            self.assertLess(best, self.budget_us,
+                            msg=f'{module} import took {best} us')
+
+    def test_no_heavy_imports(self):
+        for module in self.modules:
+            _, imported = cold_import(module)
+            self.assertFalse(imported & self.heavy,
+                             msg=f'{module} imports {imported & self.heavy}')
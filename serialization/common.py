@@ -16,7 +16,7 @@ class EncoderDecoderBase:
     methods `encode_<TYPENAME>` and `decode_<TYPENAME>`
     """
 
-    supported_types = {'int' }
+    supported_types = {'int', 'NoneType'}
     endpoint_subclasses = []
 
     def __init_subclass__(cls, **kwargs):
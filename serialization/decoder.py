@@ -13,7 +13,13 @@ class IntFieldDecoder(EncoderDecoderBase, endpoint=True):
         return real_val
 
 
-class FieldDecoder(IntFieldDecoder):
+class NoneTypeFieldDecoder(EncoderDecoderBase, endpoint=True):
+
+    def decode_NoneType(self, value: dict) -> None:
+        return None
+
+
+class FieldDecoder(IntFieldDecoder, NoneTypeFieldDecoder):
     """
     Base class for all field decoders
 
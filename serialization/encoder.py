@@ -12,7 +12,14 @@ class IntFieldEncoder(EncoderDecoderBase, endpoint=True):
                 'value': hex(value)[2:]}
 
 
-class FieldEncoder(IntFieldEncoder):
+class NoneTypeFieldEncoder(EncoderDecoderBase, endpoint=True):
+
+    def encode_NoneType(self, value: None) -> dict:
+        return {'type': 'NoneType',
+                'value': None}
+
+
+class FieldEncoder(IntFieldEncoder, NoneTypeFieldEncoder):
     """
     Class for all field encoders.
 